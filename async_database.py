@@ -0,0 +1,158 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import title_index
+from database import DEFAULT_DB_NAME
+from write_coalescer import WriteCoalescer
+
+# Reads run on a small pool so they can proceed in parallel (WAL allows it),
+# writes are serialised on their own thread so a slow commit never queues
+# in front of unrelated reads.
+READ_WORKERS = database.POOL_SIZE
+
+_read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-read")
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+# Moving a bot into the shared store copies all of its rows at once; that runs
+# here so the other bots' writes are not queued behind it on db-write
+_copy_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-copy")
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+def _read(func, *args, **kwargs):
+    return _run(_read_executor, func, *args, **kwargs)
+
+def _write(func, *args, **kwargs):
+    return _run(_write_executor, func, *args, **kwargs)
+
+# Post and admin writes arriving close together share one transaction
+writes = WriteCoalescer(_write_executor)
+
+async def init_db(initial_admin_id, db_path=DEFAULT_DB_NAME):
+    return await _write(database.init_db, initial_admin_id, db_path=db_path)
+
+async def is_admin(user_id, db_path=DEFAULT_DB_NAME):
+    # Served straight from the admin cache unless it is due a refresh
+    result = database.cached_is_admin(user_id, db_path=db_path)
+    if result is None:
+        result = await _read(database.is_admin, user_id, db_path=db_path)
+    return result
+
+async def add_admin(user_id, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.ADD_ADMIN, db_path, user_id)
+
+async def add_post(title, description, link, content, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.ADD_POST, db_path, title, description, link, content)
+
+async def import_posts(posts, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.IMPORT_POSTS, db_path, posts)
+
+async def list_posts_after(after_id, limit, db_path=DEFAULT_DB_NAME):
+    return await _read(database.list_posts_after, after_id, limit, db_path=db_path)
+
+async def list_post_headers_page(older_than=None, newer_than=None, limit=database.POSTS_PAGE_SIZE, db_path=DEFAULT_DB_NAME):
+    return await _read(database.list_post_headers_page, older_than, newer_than, limit, db_path=db_path)
+
+async def search_posts(text, offset=0, limit=database.SEARCH_PAGE_SIZE, db_path=DEFAULT_DB_NAME):
+    return await _read(database.search_posts, text, offset, limit, db_path=db_path)
+
+async def get_title_index(db_path=DEFAULT_DB_NAME):
+    """Returns the loaded title index for db_path, building it off the event loop the first time."""
+    index = title_index.get_title_index(db_path)
+    if not index.loaded:
+        await _read(index.load, db_path)
+    return index
+
+async def count_posts(db_path=DEFAULT_DB_NAME):
+    return await _read(database.count_posts, db_path=db_path)
+
+async def get_post(post_id, db_path=DEFAULT_DB_NAME):
+    return await _read(database.get_post, post_id, db_path=db_path)
+
+async def get_post_for_edit(post_id, db_path=DEFAULT_DB_NAME):
+    return await _read(database.get_post_for_edit, post_id, db_path=db_path)
+
+async def update_post_fields(post_id, changes, expected_revision, db_path=DEFAULT_DB_NAME):
+    if not changes:
+        return database.EDIT_UNCHANGED
+    database.check_editable(changes)
+    return await writes.submit(database.UPDATE_POST_FIELDS, db_path, post_id, changes, expected_revision)
+
+async def update_post(post_id, title, description, link, content, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.UPDATE_POST, db_path, post_id, title, description, link, content)
+
+async def delete_post(post_id, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.DELETE_POST, db_path, post_id)
+
+# --- Subscribers and Broadcasts ---
+
+async def add_subscriber(chat_id, db_path=DEFAULT_DB_NAME):
+    return await _write(database.add_subscriber, chat_id, db_path=db_path)
+
+async def list_subscribers(db_path=DEFAULT_DB_NAME):
+    return await _read(database.list_subscribers, db_path=db_path)
+
+async def publish_post(title, description, link, content, notify_chat_id=None, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.PUBLISH_POST, db_path, title, description, link, content, notify_chat_id)
+
+async def start_broadcast(broadcast_id, db_path=DEFAULT_DB_NAME):
+    return await _write(database.start_broadcast, broadcast_id, db_path=db_path)
+
+async def claim_broadcast_jobs(broadcast_id, after_chat_id, limit, db_path=DEFAULT_DB_NAME):
+    return await _read(database.claim_broadcast_jobs, broadcast_id, after_chat_id, limit, db_path=db_path)
+
+async def record_broadcast_results(broadcast_id, results, db_path=DEFAULT_DB_NAME):
+    return await _write(database.record_broadcast_results, broadcast_id, results, db_path=db_path)
+
+async def finish_broadcast(broadcast_id, status="done", db_path=DEFAULT_DB_NAME):
+    return await _write(database.finish_broadcast, broadcast_id, status, db_path=db_path)
+
+async def get_broadcast(broadcast_id, db_path=DEFAULT_DB_NAME):
+    return await _read(database.get_broadcast, broadcast_id, db_path=db_path)
+
+async def list_broadcasts(limit=5, unfinished=False, db_path=DEFAULT_DB_NAME):
+    return await _read(database.list_broadcasts, limit, unfinished, db_path=db_path)
+
+# --- Post Stats ---
+
+async def add_post_views(views, db_path=DEFAULT_DB_NAME):
+    return await writes.submit(database.ADD_POST_VIEWS, db_path, views)
+
+async def list_top_posts(limit=database.TOP_POSTS_LIMIT, db_path=DEFAULT_DB_NAME):
+    return await _read(database.list_top_posts, limit, db_path=db_path)
+
+# --- Persistence ---
+
+async def load_persisted_user_data(db_path=DEFAULT_DB_NAME):
+    return await _read(database.load_persisted_user_data, db_path=db_path)
+
+async def load_persisted_conversations(name, db_path=DEFAULT_DB_NAME):
+    return await _read(database.load_persisted_conversations, name, db_path=db_path)
+
+async def save_persisted_changes(user_data, conversations, db_path=DEFAULT_DB_NAME):
+    return await _write(database.save_persisted_changes, user_data, conversations, db_path=db_path)
+
+# --- Shared Store ---
+
+async def copy_tenant(source_path, db_path):
+    return await _run(_copy_executor, database.copy_tenant, source_path, db_path)
+
+# --- Child Bot Management Functions ---
+
+async def add_child_bot(token, admin_id, child_db_path, db_path=DEFAULT_DB_NAME):
+    return await _write(database.add_child_bot, token, admin_id, child_db_path, db_path=db_path)
+
+async def set_child_bot_db_path(token, child_db_path, db_path=DEFAULT_DB_NAME):
+    return await _write(database.set_child_bot_db_path, token, child_db_path, db_path=db_path)
+
+async def get_all_child_bots(db_path=DEFAULT_DB_NAME):
+    return await _read(database.get_all_child_bots, db_path=db_path)
+
+def shutdown():
+    """Waits for queued database work to finish and stops the executor threads."""
+    _copy_executor.shutdown(wait=True)
+    _write_executor.shutdown(wait=True)
+    _read_executor.shutdown(wait=True)
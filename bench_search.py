@@ -0,0 +1,89 @@
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import database
+
+VOCABULARY_SIZE = 20_000
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+def make_vocabulary(rng):
+    """Random words with Zipf-like frequencies, most frequent first, like real text."""
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 9))))
+    words = sorted(words)
+    rng.shuffle(words)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    return words, cum_weights
+
+def fill_posts(db_path, count, vocabulary, rng):
+    words, cum_weights = vocabulary
+
+    def text(length):
+        return " ".join(rng.choices(words, cum_weights=cum_weights, k=length))
+
+    with database.get_connection(db_path) as conn, conn:
+        conn.executemany(
+            "INSERT INTO posts (id, title, description, link, content) VALUES (?, ?, ?, ?, ?)",
+            ((post_id, text(6), text(20), "https://example.com", text(150)) for post_id in range(1, count + 1))
+        )
+
+def python_scan(text, db_path):
+    """What search would cost without the index: load every post and filter in Python."""
+    terms = text.lower().split()
+    matches = []
+    for post in database.get_all_posts(db_path=db_path):
+        haystack = f"{post[1]} {post[2]} {post[4]}".lower()
+        if all(term in haystack for term in terms):
+            matches.append(post)
+    return matches[:database.SEARCH_PAGE_SIZE]
+
+def time_calls(func, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            func(query)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.95) - 1]
+
+def main() -> None:
+    """Time /search against a synthetic database."""
+    parser = argparse.ArgumentParser(description="Benchmark full-text post search")
+    parser.add_argument("--posts", type=int, default=100_000, help="Number of posts to generate")
+    parser.add_argument("--repeat", type=int, default=20, help="Times each query is run")
+    parser.add_argument("--scan", action="store_true", help="Also time the Python scan baseline (slow)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(rng)
+    words = vocabulary[0]
+    # From a word in nearly every post down to a rare one, plus pairs and prefixes
+    queries = [words[0], words[20], words[500], words[15000], f"{words[20]} {words[500]}", words[3][:3], words[800][:4]]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        database.init_db(0, db_path=db_path)
+
+        started = time.perf_counter()
+        fill_posts(db_path, args.posts, vocabulary, rng)
+        print(f"Inserted {args.posts} posts (index kept by triggers) in {time.perf_counter() - started:.1f}s")
+
+        mean, p95 = time_calls(lambda q: database.search_posts(q, db_path=db_path), queries, args.repeat)
+        print(f"FTS5 search, first page: mean {mean:.2f} ms, p95 {p95:.2f} ms")
+        mean, p95 = time_calls(lambda q: database.search_posts(q, offset=50, db_path=db_path), queries, args.repeat)
+        print(f"FTS5 search, sixth page: mean {mean:.2f} ms, p95 {p95:.2f} ms")
+
+        if args.scan:
+            mean, p95 = time_calls(lambda q: python_scan(q, db_path), queries, 1)
+            print(f"Python scan over get_all_posts: mean {mean:.2f} ms, p95 {p95:.2f} ms")
+
+        database.close_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from write_coalescer import WriteCoalescer
+
+async def one_commit_per_write(executor, db_path, post_number):
+    """How post writes were made before coalescing: each in a transaction of its own."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, database.run_write, database.ADD_POST, db_path, f"Post {post_number}", "description", "https://example.com", "content"
+    )
+
+async def run_writers(write, writers, writes_per_writer):
+    """writers concurrent handlers, each awaiting its writes one after another."""
+    async def writer(number):
+        for i in range(writes_per_writer):
+            await write(number * writes_per_writer + i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(number) for number in range(writers)))
+    return time.perf_counter() - started
+
+async def bench(db_path, writers, writes_per_writer, durability):
+    executor = ThreadPoolExecutor(max_workers=1)
+    total = writers * writes_per_writer
+    label = f"{writers} writers, synchronous={durability}"
+
+    # The baseline gets the same durability, set on the pooled connection
+    with database.get_connection(db_path) as conn:
+        conn.execute(f"PRAGMA synchronous={durability}")
+    elapsed = await run_writers(lambda n: one_commit_per_write(executor, db_path, n), writers, writes_per_writer)
+    with database.get_connection(db_path) as conn:
+        conn.execute(f"PRAGMA synchronous={database.DURABILITY_NORMAL}")
+    print(f"{label}, one commit per write: {total / elapsed:.0f} writes/s, {total / elapsed:.0f} commits/s")
+
+    coalescer = WriteCoalescer(executor, durability=durability)
+
+    def write(n):
+        return coalescer.submit(database.ADD_POST, db_path, f"Post {n}", "description", "https://example.com", "content")
+
+    elapsed = await run_writers(write, writers, writes_per_writer)
+    stats = coalescer.stats()
+    print(
+        f"{label}, coalesced: {total / elapsed:.0f} writes/s, {stats['commits'] / elapsed:.0f} commits/s "
+        f"({stats['writes_per_commit']:.1f} writes per commit)"
+    )
+    executor.shutdown()
+
+def main() -> None:
+    """Compare post write throughput with and without the write coalescer."""
+    parser = argparse.ArgumentParser(description="Benchmark batched post writes")
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 10, 100], help="Concurrent writers to try")
+    parser.add_argument("--writes", type=int, default=2000, help="Total writes per run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        database.init_db(0, db_path=db_path)
+        for durability in (database.DURABILITY_NORMAL, database.DURABILITY_FULL):
+            for writers in args.writers:
+                asyncio.run(bench(db_path, writers, max(1, args.writes // writers), durability))
+        database.close_all()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,22 @@
+import asyncio
 import logging
-import subprocess
 import sys
 import os
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import (
-    Application,
-    CommandHandler,
     ContextTypes,
     ConversationHandler,
+    CommandHandler,
     MessageHandler,
-    CallbackQueryHandler,
     filters,
 )
 import database
+import async_database
+import rate_limiter
+from handlers import Tenant, build_application, cancel, make_conversations, show_admin_menu
+from tenant_runner import TenantRunner, child_db_path
+from supervisor import Supervisor
+from webhook import WebhookIngress, run_with_ingress
 
 # Enable logging
 logging.basicConfig(
@@ -25,194 +29,86 @@ TOKEN = "8455626898:AAE559TsQ1JXsYJqNsEeLuLtuBzyeaHQuHk"
 INITIAL_ADMIN_ID = 1278018722
 DEFAULT_DB = "blog_bot.db"
 
-# States for Add Post Conversation
-TITLE, DESCRIPTION, LINK, CONTENT = range(4)
-
-# States for Add Admin Conversation
-NEW_ADMIN_ID = range(1)
-
 # States for Add New Bot Conversation
 BOT_TOKEN, BOT_ADMIN_ID = range(2)
 
-# States for Edit Post Conversation
-EDIT_SELECT, EDIT_TITLE, EDIT_DESCRIPTION, EDIT_LINK, EDIT_CONTENT = range(5)
+# --- Child bots ---
 
-# --- Helper to spawn child bots ---
-def spawn_child_bot(token, admin_id, db_path):
-    """Spawns a new process for the child bot."""
-    try:
-        # Check if db_path is absolute, if not make it absolute
-        if not os.path.isabs(db_path):
-            db_path = os.path.abspath(db_path)
-            
-        cmd = [sys.executable, "child_bot.py", "--token", token, "--admin", str(admin_id), "--db_path", db_path]
-        
-        # Use Popen to run in background
-        # We use CREATE_NEW_CONSOLE on Windows to ensure it runs independently and visible
-        creation_flags = 0
-        if sys.platform == "win32":
-            creation_flags = subprocess.CREATE_NEW_CONSOLE
-            
-        process = subprocess.Popen(cmd, cwd=os.getcwd(), creationflags=creation_flags) 
-        logger.info(f"Started child bot process with PID {process.pid}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to spawn child bot: {e}")
-        return False
-
-def start_existing_bots():
-    """Starts all child bots found in the database."""
-    bots = database.get_all_child_bots()
-    count = 0
-    for bot in bots:
-        # bot: id, token, admin_id, db_path, created_at
-        _, token, admin_id, db_path, _ = bot
-        if spawn_child_bot(token, admin_id, db_path):
-            count += 1
-    logger.info(f"Started {count} existing child bots.")
-
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Starts the bot and shows options based on user role."""
-    user = update.effective_user
-    user_id = user.id
-    
-    if database.is_admin(user_id):
-        await show_admin_menu(update, context)
-    else:
-        await show_user_menu(update, context)
+# Set to the public HTTPS base URL to receive updates for the main bot and all
+# in-process child bots through one webhook server instead of polling
+WEBHOOK_URL = ""
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
 
-async def show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    keyboard = [
-        ["Add New Post", "View All Posts"],
-        ["Manage Posts"]
-    ]
-    
-    # Only the initial admin (Super Admin) can see the "Add New Admin" button
-    if user_id == INITIAL_ADMIN_ID:
-        keyboard.append(["Add New Admin"])
-        keyboard.append(["Add New Bot"])
-        
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    await update.message.reply_text(
-        "Welcome Admin! What would you like to do?",
-        reply_markup=reply_markup
-    )
+# Child bots run inside this process's event loop. Set above 0 to instead
+# spread them over that many tenant_runner.py worker processes.
+CHILD_BOT_WORKERS = 0
 
-def get_user_menu_content():
-    """Returns the text and reply_markup for the user menu."""
-    posts = database.get_all_posts()
-    if not posts:
-        return "Welcome! There are no blog posts yet. Stay tuned!", None
+# Child bots keep their data in a bot_<id>.db file each. Set to a database file
+# to keep them all in that one file instead, partitioned by bot id; bots that
+# still have a file of their own are moved into it, one at a time, on startup.
+CHILD_BOT_STORE = ""
 
-    keyboard = []
-    for post in posts:
-        post_id, title, description, link, content, created_at = post
-        keyboard.append([InlineKeyboardButton(title, callback_data=f"view_post_{post_id}")])
+tenant_runner = TenantRunner()
+supervisor = Supervisor()
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    return f"Welcome! Here are the latest blog posts ({len(posts)}). Click a title to read more:", reply_markup
+def tenant_worker_command(shard, shards):
+    """Command line for a worker process that runs one shard of the child bots."""
+    return [
+        sys.executable, "tenant_runner.py",
+        "--main_db", os.path.abspath(DEFAULT_DB),
+        "--shard", str(shard), "--shards", str(shards),
+        "--heartbeat",
+    ] + (["--shared_store", os.path.abspath(CHILD_BOT_STORE)] if CHILD_BOT_STORE else [])
 
-async def show_user_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    text, reply_markup = get_user_menu_content()
-    await update.message.reply_text(text, reply_markup=reply_markup)
+class MainTenant(Tenant):
+    """The main bot: a tenant whose Initial Admin (the Super Admin) can also
+    create child bots, and whose /stats covers every bot in the process."""
 
-# --- Add Post Conversation ---
+    admin_buttons = Tenant.admin_buttons + [["Add New Bot"]]
 
-async def add_post_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user_id = update.effective_user.id
-    if not database.is_admin(user_id):
-        await update.message.reply_text("You are not authorized to perform this action.")
-        return ConversationHandler.END
+    def __init__(self):
+        super().__init__(TOKEN, INITIAL_ADMIN_ID, DEFAULT_DB, name="main")
 
-    await update.message.reply_text(
-        "Let's create a new blog post.\n"
-        "Please enter the <b>Title</b> of the post:",
-        parse_mode="HTML",
-        reply_markup=ReplyKeyboardRemove()
-    )
-    return TITLE
-
-async def received_title(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['post_title'] = update.message.text
-    await update.message.reply_text("Got it. Now please enter the <b>Description</b> (short summary):", parse_mode="HTML")
-    return DESCRIPTION
-
-async def received_description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['post_description'] = update.message.text
-    await update.message.reply_text("Okay. Now please enter the <b>Link</b> to the full post/resource:", parse_mode="HTML")
-    return LINK
-
-async def received_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['post_link'] = update.message.text
-    await update.message.reply_text("Almost done. Please enter the main <b>Content</b> or details for this post:", parse_mode="HTML")
-    return CONTENT
-
-async def received_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['post_content'] = update.message.text
-    
-    # Save to database
-    database.add_post(
-        context.user_data['post_title'],
-        context.user_data['post_description'],
-        context.user_data['post_link'],
-        context.user_data['post_content']
-    )
-    
-    await update.message.reply_text("Blog post created successfully!")
-    await show_admin_menu(update, context)
-    return ConversationHandler.END
-
-async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    await update.message.reply_text("Operation cancelled.")
-    user_id = update.effective_user.id
-    if database.is_admin(user_id):
-        await show_admin_menu(update, context)
-    else:
-        await show_user_menu(update, context)
-    return ConversationHandler.END
+    def conversations(self):
+        return make_conversations() + [make_add_bot_conversation()]
 
-# --- Add Admin Conversation ---
+    async def start(self, application):
+        """Resumes broadcasts, then starts all child bots found in the database."""
+        await super().start(application)
 
-async def add_admin_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user_id = update.effective_user.id
-    
-    # Check if user is the Super Admin
-    if user_id != INITIAL_ADMIN_ID:
-        await update.message.reply_text("You are not authorized to perform this action. Only the Super Admin can add new admins.")
-        return ConversationHandler.END
+        if CHILD_BOT_WORKERS:
+            for shard in range(CHILD_BOT_WORKERS):
+                supervisor.add(f"worker {shard}/{CHILD_BOT_WORKERS}", tenant_worker_command(shard, CHILD_BOT_WORKERS))
+            await supervisor.start()
+            return
 
-    if not database.is_admin(user_id):
-        await update.message.reply_text("You are not authorized to perform this action.")
-        return ConversationHandler.END
+        # The main bot starts serving straight away; child bots come up behind
+        # it, and are then checked every few seconds and restarted if they die
+        tenant_runner.sync_in_background(self.db_path, shared_store=CHILD_BOT_STORE)
 
-    await update.message.reply_text(
-        "Please enter the <b>Telegram ID</b> of the new admin:\n"
-        "(You can ask them to use @userinfobot to find their ID)",
-        parse_mode="HTML",
-        reply_markup=ReplyKeyboardRemove()
-    )
-    return NEW_ADMIN_ID
+    async def shutdown(self, application):
+        """Stops the child bot upkeep loop and the child bots together with the main bot."""
+        await tenant_runner.stop()
+        await supervisor.stop()
 
-async def received_admin_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    try:
-        new_admin_id = int(update.message.text)
-        if database.add_admin(new_admin_id):
-            await update.message.reply_text(f"User {new_admin_id} has been added as an admin.")
-        else:
-            await update.message.reply_text("Failed to add admin. They might already be an admin.")
-    except ValueError:
-        await update.message.reply_text("Invalid ID. Please enter a numeric User ID.")
-        return NEW_ADMIN_ID # Ask again
+    def send_metrics(self, bot):
+        # Every bot in this process, not only the main one
+        return rate_limiter.all_metrics()
 
-    await show_admin_menu(update, context)
-    return ConversationHandler.END
+    async def stats_sections(self, bot):
+        sections = await super().stats_sections(bot)
+        if tenant_runner.readiness:
+            sections.append("\n".join(tenant_runner.startup_report()))
+        if supervisor.children:
+            sections.append("Child bot workers:\n" + "\n".join(supervisor.status()))
+        return sections
 
 # --- Add New Bot Conversation ---
 
 async def add_bot_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
-    if user_id != INITIAL_ADMIN_ID:
+    if user_id != context.bot_data['tenant'].admin_id:
         await update.message.reply_text("You are not authorized to perform this action.")
         return ConversationHandler.END
 
@@ -237,28 +133,30 @@ async def received_bot_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         new_bot_admin_id = int(update.message.text)
         token = context.user_data['new_bot_token']
-        
-        # Create a unique DB path for this bot
-        # Using the token's first part (ID) to ensure uniqueness and validity
-        bot_id_part = token.split(':')[0]
-        child_db_path = f"bot_{bot_id_part}.db"
-        
+
+        # A unique DB path for this bot, from the token's first part (its ID)
+        new_bot_db_path = child_db_path(token, CHILD_BOT_STORE)
+
         # Save to main DB
-        if database.add_child_bot(token, new_bot_admin_id, child_db_path):
-            # Spawn the process
-            if spawn_child_bot(token, new_bot_admin_id, child_db_path):
+        if await async_database.add_child_bot(token, new_bot_admin_id, new_bot_db_path, db_path=context.bot_data['tenant'].db_path):
+            if CHILD_BOT_WORKERS:
+                # Its shard worker picks it up on the next refresh
+                started = True
+            else:
+                started = await tenant_runner.add_tenant(token, new_bot_admin_id, new_bot_db_path)
+            if started:
                 await update.message.reply_text(
                     f"<b>Success!</b>\n"
                     f"New bot has been created and started.\n"
                     f"Admin ID: {new_bot_admin_id}\n"
-                    f"DB File: {child_db_path}",
+                    f"DB File: {new_bot_db_path}",
                     parse_mode="HTML"
                 )
             else:
-                 await update.message.reply_text("Bot recorded in DB but failed to start process. Check logs.")
+                 await update.message.reply_text("Bot recorded in DB but failed to start. Check logs.")
         else:
             await update.message.reply_text("Failed to add bot to database. Token might be duplicate.")
-            
+
     except ValueError:
         await update.message.reply_text("Invalid ID. Please enter a numeric User ID.")
         return BOT_ADMIN_ID
@@ -266,243 +164,39 @@ async def received_bot_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await show_admin_menu(update, context)
     return ConversationHandler.END
 
-# --- Manage Posts Handlers ---
-
-async def manage_posts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Lists posts with Edit/Delete buttons."""
-    user_id = update.effective_user.id
-    if not database.is_admin(user_id):
-        await update.message.reply_text("You are not authorized to perform this action.")
-        return
-
-    posts = database.get_all_posts()
-    if not posts:
-        await update.message.reply_text("No posts to manage.")
-        return
-
-    await update.message.reply_text("Select a post to manage:")
-    
-    for post in posts:
-        post_id, title, description, link, content, created_at = post
-        keyboard = [
-            [
-                InlineKeyboardButton("Edit", callback_data=f"edit_{post_id}"),
-                InlineKeyboardButton("Delete", callback_data=f"delete_{post_id}")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(f"<b>{title}</b>\n{created_at}", reply_markup=reply_markup, parse_mode="HTML")
-
-async def post_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handles Edit, Delete, and View Post button clicks."""
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    
-    if data == "back_to_list":
-        text, reply_markup = get_user_menu_content()
-        await query.edit_message_text(text, reply_markup=reply_markup)
-        return
-    
-    if data.startswith("view_post_"):
-        _, _, post_id = data.split('_')
-        post_id = int(post_id)
-        post = database.get_post(post_id)
-        
-        if not post:
-            await query.edit_message_text("This post no longer exists.")
-            return
-
-        post_id, title, description, link, content, created_at = post
-        message = (
-            f"<b>{title}</b>\n\n"
-            f"<i>{description}</i>\n\n"
-            f"{link}\n\n"
-            f"{content}"
-        )
-        
-        # Add Back button
-        keyboard = [[InlineKeyboardButton("« Back to List", callback_data="back_to_list")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(text=message, parse_mode="HTML", reply_markup=reply_markup)
-        return
-
-    action, post_id = data.split('_')
-    post_id = int(post_id)
-
-    if action == "delete":
-        if database.delete_post(post_id):
-            await query.edit_message_text(f"Post deleted successfully.")
-        else:
-            await query.edit_message_text("Failed to delete post.")
-            
-    elif action == "edit":
-        # Start Edit Conversation manually? 
-        # Since CallbackQueryHandler can't directly start a ConversationHandler entry point easily if it's not set up that way.
-        # But we can trigger it if we set up the entry point to accept callback queries.
-        # However, for simplicity, let's just tell the user what to do or use a different approach.
-        # Actually, we can use context.user_data to store the post_id and then transition.
-        # But `edit_post_start` needs to be triggered.
-        # Let's try to make the ConversationHandler accept the callback query as entry point.
-        pass # Handled by ConversationHandler entry points
-
-# --- Edit Post Conversation ---
-
-async def edit_post_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    
-    data = query.data
-    _, post_id = data.split('_')
-    context.user_data['edit_post_id'] = int(post_id)
-    
-    post = database.get_post(int(post_id))
-    if not post:
-        await query.edit_message_text("Post not found.")
-        return ConversationHandler.END
-        
-    post_id, title, description, link, content, created_at = post
-    
-    await query.edit_message_text(
-        f"Editing Post: <b>{title}</b>\n\n"
-        "Please enter the new <b>Title</b> (or send . to keep current):",
-        parse_mode="HTML"
-    )
-    return EDIT_TITLE
-
-async def edit_received_title(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text
-    if text != '.':
-        context.user_data['edit_title'] = text
-    else:
-        # Fetch original if not changed? 
-        # We need to fetch original again or store it. Let's fetch to be safe.
-        post = database.get_post(context.user_data['edit_post_id'])
-        context.user_data['edit_title'] = post[1]
-        
-    await update.message.reply_text("Enter new <b>Description</b> (or . to keep current):", parse_mode="HTML")
-    return EDIT_DESCRIPTION
-
-async def edit_received_description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text
-    if text != '.':
-        context.user_data['edit_description'] = text
-    else:
-        post = database.get_post(context.user_data['edit_post_id'])
-        context.user_data['edit_description'] = post[2]
-
-    await update.message.reply_text("Enter new <b>Link</b> (or . to keep current):", parse_mode="HTML")
-    return EDIT_LINK
-
-async def edit_received_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text
-    if text != '.':
-        context.user_data['edit_link'] = text
-    else:
-        post = database.get_post(context.user_data['edit_post_id'])
-        context.user_data['edit_link'] = post[3]
-
-    await update.message.reply_text("Enter new <b>Content</b> (or . to keep current):", parse_mode="HTML")
-    return EDIT_CONTENT
-
-async def edit_received_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    text = update.message.text
-    if text != '.':
-        context.user_data['edit_content'] = text
-    else:
-        post = database.get_post(context.user_data['edit_post_id'])
-        context.user_data['edit_content'] = post[4]
-        
-    # Update DB
-    database.update_post(
-        context.user_data['edit_post_id'],
-        context.user_data['edit_title'],
-        context.user_data['edit_description'],
-        context.user_data['edit_link'],
-        context.user_data['edit_content']
-    )
-    
-    await update.message.reply_text("Post updated successfully!")
-    await show_admin_menu(update, context)
-    return ConversationHandler.END
-
-# --- View Posts Handler (for Admin menu) ---
-async def view_posts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await show_user_menu(update, context)
-    # If admin, show menu again after listing posts so they don't get stuck
-    if database.is_admin(update.effective_user.id):
-        await show_admin_menu(update, context)
-
-
-def main() -> None:
-    """Run the bot."""
-    # Initialize Database
-    database.init_db(INITIAL_ADMIN_ID)
-    
-    # Create the Application
-    application = Application.builder().token(TOKEN).build()
-
-    # Add Post Conversation
-    add_post_conv = ConversationHandler(
-        entry_points=[MessageHandler(filters.Regex("^Add New Post$"), add_post_start)],
-        states={
-            TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_title)],
-            DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_description)],
-            LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_link)],
-            CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_content)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-
-    # Add Admin Conversation
-    add_admin_conv = ConversationHandler(
-        entry_points=[MessageHandler(filters.Regex("^Add New Admin$"), add_admin_start)],
-        states={
-            NEW_ADMIN_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_admin_id)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-
+def make_add_bot_conversation():
     # Add Bot Conversation
-    add_bot_conv = ConversationHandler(
+    return ConversationHandler(
         entry_points=[MessageHandler(filters.Regex("^Add New Bot$"), add_bot_start)],
         states={
             BOT_TOKEN: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_bot_token)],
             BOT_ADMIN_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_bot_admin)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="add_bot",
+        persistent=True,
     )
 
-    # Edit Post Conversation
-    edit_post_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(edit_post_start, pattern="^edit_")],
-        states={
-            EDIT_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_title)],
-            EDIT_DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_description)],
-            EDIT_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_link)],
-            EDIT_CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_content)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
 
-    application.add_handler(add_post_conv)
-    application.add_handler(add_admin_conv)
-    application.add_handler(add_bot_conv)
-    application.add_handler(edit_post_conv)
-    
-    application.add_handler(MessageHandler(filters.Regex("^Manage Posts$"), manage_posts_handler))
-    application.add_handler(CallbackQueryHandler(post_action_callback, pattern="^delete_|^view_post_|^back_to_list$"))
-    
-    application.add_handler(MessageHandler(filters.Regex("^View All Posts$"), view_posts_handler))
-    application.add_handler(CommandHandler("start", start))
+def main() -> None:
+    """Run the bot."""
+    # Initialize Database
+    database.init_db(INITIAL_ADMIN_ID, db_path=DEFAULT_DB)
 
-    # Start existing child bots
-    start_existing_bots()
+    # Create the Application
+    application = build_application(MainTenant())
 
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        ingress = WebhookIngress(WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT)
+        tenant_runner.ingress = ingress
+        asyncio.run(run_with_ingress(application, ingress))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+    # Drain pending database work and release pooled connections
+    async_database.shutdown()
+    database.close_all()
 
 if __name__ == "__main__":
     main()
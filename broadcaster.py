@@ -0,0 +1,179 @@
+import asyncio
+import html
+import logging
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+import async_database
+import database
+from rate_limiter import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# Sends in flight per broadcast; the bot's SendScheduler still enforces Telegram's limits
+BROADCAST_WORKERS = 8
+# Jobs claimed, and results committed, per batch
+BROADCAST_BATCH = 100
+# Attempts per recipient before a transient error counts as a failure
+BROADCAST_MAX_ATTEMPTS = 3
+# Broadcasts listed by report()
+BROADCAST_REPORT_LIMIT = 5
+# Below every chat id (group chats have negative ids)
+FIRST_CHAT_CURSOR = -(2 ** 63)
+
+def render_announcement(post):
+    """The message sent to subscribers for a new post, with a button that opens it."""
+    post_id, title, description, link, content, created_at = post
+    text = f"New post: <b>{html.escape(title)}</b>\n\n<i>{html.escape(description or '')}</i>"
+    keyboard = [[InlineKeyboardButton("Read post", callback_data=f"view_post_{post_id}")]]
+    return text, InlineKeyboardMarkup(keyboard)
+
+def format_broadcast(broadcast):
+    """One line of completion and throughput figures for a broadcasts row."""
+    broadcast_id, post_id, _, status, total, sent, failed, blocked, _, started_at, finished_at = broadcast
+    done = sent + failed + blocked
+    line = f"Broadcast #{broadcast_id} (post {post_id}): {status}, {sent}/{total} sent, {failed} failed, {blocked} blocked"
+    if started_at:
+        elapsed = (finished_at or time.time()) - started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+        line += f", {done * 100 // max(total, 1)}% in {elapsed:.0f}s ({rate:.1f} msg/s)"
+    return line
+
+class Broadcaster:
+    """Sends new posts to every subscriber of one bot.
+
+    A broadcast is written to the database as one job per subscriber before
+    anything is sent. Workers claim jobs in batches, send with bounded
+    concurrency on the bulk lane of the bot's SendScheduler, and commit each
+    batch's results in one transaction. start() resumes any broadcast left
+    unfinished by a crash or restart; at most one batch is sent twice.
+
+    Subscribers are recorded on /start. The known set is kept in memory so
+    repeat /starts cost no write.
+    """
+
+    def __init__(self, db_path=database.DEFAULT_DB_NAME, workers=BROADCAST_WORKERS, batch_size=BROADCAST_BATCH):
+        self.db_path = db_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.bot = None
+        self._subscribers = None
+        self._tasks = {}
+
+    async def start(self, bot):
+        """Loads subscribers and resumes unfinished broadcasts."""
+        self.bot = bot
+        self._subscribers = set(await async_database.list_subscribers(db_path=self.db_path))
+        for broadcast in await async_database.list_broadcasts(unfinished=True, db_path=self.db_path):
+            logger.info(f"Resuming broadcast #{broadcast[0]}")
+            self._launch(broadcast[0], broadcast[1], broadcast[2])
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+
+    async def subscribe(self, chat_id):
+        if self._subscribers is not None and chat_id in self._subscribers:
+            return
+        if await async_database.add_subscriber(chat_id, db_path=self.db_path) and self._subscribers is not None:
+            self._subscribers.add(chat_id)
+
+    async def publish_post(self, title, description, link, content, notify_chat_id=None):
+        """Adds a new post and its broadcast in one write, then starts sending.
+
+        Returns the new post's id, or None if nothing was saved.
+        """
+        post_id, broadcast_id = await async_database.publish_post(
+            title, description, link, content, notify_chat_id, db_path=self.db_path
+        )
+        if broadcast_id is not None:
+            self._launch(broadcast_id, post_id, notify_chat_id)
+        return post_id
+
+    def _launch(self, broadcast_id, post_id, notify_chat_id):
+        if broadcast_id not in self._tasks:
+            self._tasks[broadcast_id] = asyncio.create_task(self._run(broadcast_id, post_id, notify_chat_id))
+
+    async def _run(self, broadcast_id, post_id, notify_chat_id):
+        try:
+            post = await async_database.get_post(post_id, db_path=self.db_path)
+            if post is None:
+                await async_database.finish_broadcast(broadcast_id, "cancelled", db_path=self.db_path)
+                return
+            text, reply_markup = render_announcement(post)
+            await async_database.start_broadcast(broadcast_id, db_path=self.db_path)
+
+            semaphore = asyncio.Semaphore(self.workers)
+
+            async def send(chat_id, attempts):
+                async with semaphore:
+                    return chat_id, await self._send(chat_id, attempts, text, reply_markup)
+
+            # Walk the pending jobs in chat id order; jobs left pending after a
+            # transient error are picked up by the next pass
+            after = FIRST_CHAT_CURSOR
+            while True:
+                jobs = await async_database.claim_broadcast_jobs(
+                    broadcast_id, after, self.batch_size, db_path=self.db_path
+                )
+                if not jobs:
+                    if after == FIRST_CHAT_CURSOR:
+                        break
+                    after = FIRST_CHAT_CURSOR
+                    continue
+                results = dict(await asyncio.gather(*(send(chat_id, attempts) for chat_id, attempts in jobs)))
+                await async_database.record_broadcast_results(broadcast_id, results, db_path=self.db_path)
+                if self._subscribers is not None:
+                    self._subscribers.difference_update(
+                        chat_id for chat_id, state in results.items() if state == database.JOB_BLOCKED
+                    )
+                after = jobs[-1][0]
+
+            await async_database.finish_broadcast(broadcast_id, db_path=self.db_path)
+            broadcast = await async_database.get_broadcast(broadcast_id, db_path=self.db_path)
+            report = format_broadcast(broadcast)
+            logger.info(report)
+            if notify_chat_id is not None:
+                await self.bot.send_message(notify_chat_id, report)
+        except asyncio.CancelledError:
+            # Left unfinished on purpose; start() picks it up again
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast #{broadcast_id} stopped: {e}")
+        finally:
+            self._tasks.pop(broadcast_id, None)
+
+    async def _send(self, chat_id, attempts, text, reply_markup):
+        """Sends one announcement and returns the job's new state."""
+        try:
+            await self.bot.send_message(
+                chat_id,
+                text,
+                parse_mode="HTML",
+                reply_markup=reply_markup,
+                rate_limit_args={"priority": PRIORITY_BULK},
+            )
+            return database.JOB_SENT
+        except Forbidden:
+            return database.JOB_BLOCKED
+        except BadRequest as e:
+            logger.warning(f"Broadcast to {chat_id} rejected: {e}")
+            return database.JOB_FAILED
+        except (RetryAfter, NetworkError) as e:
+            if attempts + 1 >= BROADCAST_MAX_ATTEMPTS:
+                logger.warning(f"Broadcast to {chat_id} gave up after {attempts + 1} attempts: {e}")
+                return database.JOB_FAILED
+            return database.JOB_PENDING
+        except TelegramError as e:
+            logger.warning(f"Broadcast to {chat_id} failed: {e}")
+            return database.JOB_FAILED
+
+    async def report(self):
+        """Lines describing the latest broadcasts."""
+        broadcasts = await async_database.list_broadcasts(BROADCAST_REPORT_LIMIT, db_path=self.db_path)
+        return [format_broadcast(broadcast) for broadcast in broadcasts]
@@ -1,19 +1,291 @@
+import os
+import re
+import functools
+import queue
 import sqlite3
 import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
 
 DEFAULT_DB_NAME = "blog_bot.db"
 
-def init_db(initial_admin_id, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+# Listing row: just what menus need, without the post body
+PostHeader = namedtuple("PostHeader", ("id", "title", "created_at"))
+
+# Keyset pagination for post listings
+POSTS_PAGE_SIZE = 10
+PostPage = namedtuple("PostPage", ("headers", "has_newer", "has_older"))
+
+# Full-text search results, best match first
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_TERMS = 8
+# Only the newest this many matches are ranked, so very common words cost a
+# bounded amount of work instead of scoring the whole table
+SEARCH_RANK_WINDOW = 5000
+SearchPage = namedtuple("SearchPage", ("headers", "has_more"))
+
+# Columns an edit may change, and the outcomes of update_post_fields
+EDITABLE_POST_COLUMNS = ("title", "description", "link", "content")
+EDIT_SAVED = "saved"
+EDIT_UNCHANGED = "unchanged"
+EDIT_CONFLICT = "conflict"
+EDIT_FAILED = "failed"
+
+# Broadcast job states
+JOB_PENDING = 0
+JOB_SENT = 1
+JOB_FAILED = 2
+JOB_BLOCKED = 3     # the user blocked the bot; they are unsubscribed
+
+# --- Tenant Locations ---
+
+# Many bots can share one database file, each owning the rows tagged with its
+# bot_id. Such a bot is addressed as "<file>#<bot_id>"; a plain path is a
+# database of its own, whose rows all have bot_id 0.
+TENANT_SEPARATOR = "#"
+
+def tenant_location(db_file, bot_id):
+    """The db_path of bot_id inside the shared database file db_file."""
+    return f"{db_file}{TENANT_SEPARATOR}{bot_id}"
+
+@functools.lru_cache(maxsize=None)
+def split_location(db_path):
+    """Returns (absolute database file, bot_id) for a db_path."""
+    db_file, separator, bot_id = db_path.rpartition(TENANT_SEPARATOR)
+    if separator and bot_id.isdigit():
+        return os.path.abspath(db_file), int(bot_id)
+    return os.path.abspath(db_path), 0
+
+# --- Connection Pool ---
+
+# Long-lived connections kept per database file
+POOL_SIZE = 4
+# Number of prepared statements sqlite3 keeps compiled per connection
+STATEMENT_CACHE_SIZE = 128
+
+# Applied to every new connection
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",       # ~8 MB page cache
+    "PRAGMA mmap_size=67108864",     # 64 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class ConnectionPool:
+    """A small pool of long-lived connections to one SQLite file."""
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.size:
+                conn = self._open()
+                self._connections.append(conn)
+                return conn
+        # Pool exhausted, wait for another thread to hand one back
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._idle = queue.LifoQueue()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def _db_key(db_path):
+    # Different spellings of the same bot's database share its caches
+    db_file, bot_id = split_location(db_path)
+    return tenant_location(db_file, bot_id) if bot_id else db_file
+
+def get_pool(db_path=DEFAULT_DB_NAME):
+    """Returns the connection pool for db_path's file, creating it on first use.
+
+    All bots sharing a file share its pool.
+    """
+    key = split_location(db_path)[0]
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(key)
+                _pools[key] = pool
+    return pool
+
+@contextmanager
+def get_connection(db_path=DEFAULT_DB_NAME):
+    """Borrows a pooled connection for the duration of the with block."""
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def close_all():
+    """Closes every pooled connection. Call on shutdown."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        for cache in _admin_caches.values():
+            cache.close()
+        _admin_caches.clear()
+        _migrated.clear()
+
+def close_db(db_path):
+    """Closes the pooled connections to db_path's file, e.g. once its bots have moved elsewhere."""
+    db_file = split_location(db_path)[0]
+    with _pools_lock:
+        pool = _pools.pop(db_file, None)
+        cache = _admin_caches.pop(db_file, None)
+        _migrated.discard(db_file)
+    if pool is not None:
+        pool.close()
+    if cache is not None:
+        cache.close()
+
+# --- Post Change Tracking ---
+
+# Per-database counter bumped after every committed post write; caches built
+# from the posts table remember the generation they were rendered at.
+_post_generations = {}
+
+def get_post_generation(db_path=DEFAULT_DB_NAME):
+    return _post_generations.get(_db_key(db_path), 0)
+
+# Called after every committed post write as listener(db_key, post_id, post),
+# where post is the new (title, description, link, content) or None on delete.
+# Listeners run on the writing thread and must be quick.
+_post_listeners = []
+
+def add_post_listener(listener):
+    _post_listeners.append(listener)
+
+def _post_changed(db_path, post_id, post):
+    key = _db_key(db_path)
+    with _pools_lock:
+        _post_generations[key] = _post_generations.get(key, 0) + 1
+    for listener in _post_listeners:
+        try:
+            listener(key, post_id, post)
+        except Exception as e:
+            logging.error(f"Post listener failed: {e}")
+
+# --- Admin Cache ---
+
+# Seconds between checks for admin changes made by other processes
+ADMIN_CACHE_CHECK_INTERVAL = 2.0
+
+class AdminCache:
+    """In-memory admin ids of every bot in one database file, by bot_id.
+
+    Writes made through add_admin update the set directly. Changes committed
+    by other processes are picked up by polling PRAGMA data_version, which only
+    moves when another connection commits, on a dedicated connection at most
+    once per ADMIN_CACHE_CHECK_INTERVAL.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.admins = {}
+        self.loaded = False
+        self.checked_at = 0.0
+        self._data_version = None
+        self._version_conn = None
+        self._lock = threading.Lock()
+
+    def _current_data_version(self):
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def is_fresh(self):
+        return self.loaded and time.monotonic() - self.checked_at < ADMIN_CACHE_CHECK_INTERVAL
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and self.is_fresh():
+                return
+            # Read the version first so a concurrent commit triggers another reload
+            version = self._current_data_version()
+            if force or not self.loaded or version != self._data_version:
+                with get_connection(self.db_path) as conn:
+                    rows = conn.execute("SELECT bot_id, user_id FROM admins").fetchall()
+                admins = {}
+                for bot_id, user_id in rows:
+                    admins.setdefault(bot_id, set()).add(user_id)
+                self.admins = admins
+                self._data_version = version
+                self.loaded = True
+            self.checked_at = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+            self.loaded = False
+
+_admin_caches = {}
+
+def get_admin_cache(db_path=DEFAULT_DB_NAME):
+    key = split_location(db_path)[0]
+    cache = _admin_caches.get(key)
+    if cache is None:
+        with _pools_lock:
+            cache = _admin_caches.setdefault(key, AdminCache(key))
+    return cache
+
+def cached_is_admin(user_id, db_path=DEFAULT_DB_NAME):
+    """Answers from memory, or returns None when the cache is due a refresh."""
+    cache = get_admin_cache(db_path)
+    if not cache.is_fresh():
+        return None
+    return user_id in cache.admins.get(split_location(db_path)[1], ())
+
+# --- Schema Migrations ---
+
+def _create_base_schema(cursor):
     # Create admins table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS admins (
             user_id INTEGER PRIMARY KEY
         )
     ''')
-    
+
     # Create posts table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS posts (
@@ -36,121 +308,882 @@ def init_db(initial_admin_id, db_path=DEFAULT_DB_NAME):
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
-    # Add initial admin if not exists
+
+def _add_post_listing_index(cursor):
+    # Serves ORDER BY created_at DESC, id DESC and the keyset page cursors
+    # without a full scan or temp B-tree sort (id is the rowid, already in the index)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at)")
+
+def _add_post_search_index(cursor):
+    # External-content FTS5 index over the searchable columns: the text stays in
+    # posts and only the index is stored. Prefix indexes keep "term*" queries fast.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            title, description, content,
+            content='posts', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    # Matches in the title count most, then the description, then the body
+    cursor.execute("INSERT INTO posts_fts (posts_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')")
+
+    # Keep the index in step with every write to posts
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, title, description, content)
+            VALUES (new.id, new.title, new.description, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, title, description, content)
+            VALUES ('delete', old.id, old.title, old.description, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, description, content ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, title, description, content)
+            VALUES ('delete', old.id, old.title, old.description, old.content);
+            INSERT INTO posts_fts (rowid, title, description, content)
+            VALUES (new.id, new.title, new.description, new.content);
+        END
+    ''')
+
+    # Index the posts written before this migration
+    cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
+def _add_post_revision(cursor):
+    # Bumped by every write to a post, so an edit can tell if the row changed under it
+    cursor.execute("ALTER TABLE posts ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+def _add_broadcasts(cursor):
+    # Readers who pressed /start, the audience of new post broadcasts
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS subscribers (
+            chat_id INTEGER PRIMARY KEY,
+            active INTEGER NOT NULL DEFAULT 1,
+            subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # One row per broadcast; times are Unix seconds so throughput can be measured
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL,
+            notify_chat_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+    ''')
+
+    # One job per recipient, written when the broadcast is created so a crash loses nothing
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            broadcast_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (broadcast_id, chat_id)
+        ) WITHOUT ROWID
+    ''')
+    # Only pending jobs are ever looked up, so only they are indexed
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_pending
+        ON broadcast_jobs (broadcast_id, chat_id) WHERE status = 0
+    ''')
+
+def _add_persistence(cursor):
+    # Conversation state and user_data kept across restarts by SQLitePersistence
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persisted_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS persisted_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state BLOB NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+    ''')
+
+def _create_post_search_index(cursor):
+    # As _add_post_search_index, over the bot_id-partitioned posts table. bot_id
+    # is indexed too, so a bot's search in a shared file only walks its own posts.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE posts_fts USING fts5(
+            bot_id, title, description, content,
+            content='posts', content_rowid='row_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute("INSERT INTO posts_fts (posts_fts, rank) VALUES ('rank', 'bm25(0.0, 10.0, 4.0, 1.0)')")
+    cursor.execute('''
+        CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, bot_id, title, description, content)
+            VALUES (new.row_id, new.bot_id, new.title, new.description, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, bot_id, title, description, content)
+            VALUES ('delete', old.row_id, old.bot_id, old.title, old.description, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER posts_fts_update AFTER UPDATE OF title, description, content ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, bot_id, title, description, content)
+            VALUES ('delete', old.row_id, old.bot_id, old.title, old.description, old.content);
+            INSERT INTO posts_fts (rowid, bot_id, title, description, content)
+            VALUES (new.row_id, new.bot_id, new.title, new.description, new.content);
+        END
+    ''')
+    cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
+def _rebuild_with_bot_id(cursor, table, definition, columns, options=""):
+    # SQLite cannot change a primary key in place, so copy into a new table
+    cursor.execute(f"CREATE TABLE {table}_new (bot_id INTEGER NOT NULL DEFAULT 0, {definition}) {options}")
+    cursor.execute(f"INSERT INTO {table}_new (bot_id, {columns}) SELECT 0, {columns} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+def _partition_by_bot(cursor):
+    # Lets many bots share one file: every per-bot table gets a bot_id column
+    # leading its key and indexes. Existing rows belong to bot 0, the owner of a
+    # single-bot file. Broadcast jobs hang off a broadcast id and need no bot_id.
+
+    # Posts keep their per-bot ids, which appear in buttons already sent, so
+    # the table gets a separate row_id for the search index to point at
+    last_id = cursor.execute(
+        "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'posts'), 0), "
+        "COALESCE((SELECT MAX(id) FROM posts), 0))"
+    ).fetchone()[0]
+    for trigger in ("posts_fts_insert", "posts_fts_delete", "posts_fts_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS posts_fts")
+    cursor.execute("DROP INDEX IF EXISTS idx_posts_created_at")
+    cursor.execute('''
+        CREATE TABLE posts_new (
+            row_id INTEGER PRIMARY KEY,
+            bot_id INTEGER NOT NULL DEFAULT 0,
+            id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            link TEXT,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            revision INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (bot_id, id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO posts_new (row_id, bot_id, id, title, description, link, content, created_at, revision)
+        SELECT id, 0, id, title, description, link, content, created_at, revision FROM posts
+    ''')
+    cursor.execute("DROP TABLE posts")
+    cursor.execute("ALTER TABLE posts_new RENAME TO posts")
+    # Listing order and keyset cursors within one bot
+    cursor.execute("CREATE INDEX idx_posts_bot_created_at ON posts (bot_id, created_at, id)")
+
+    # Last post id handed out per bot; ids are never reused, like AUTOINCREMENT
+    cursor.execute("CREATE TABLE post_ids (bot_id INTEGER PRIMARY KEY, last_id INTEGER NOT NULL)")
+    if last_id:
+        cursor.execute("INSERT INTO post_ids (bot_id, last_id) VALUES (0, ?)", (last_id,))
+    _create_post_search_index(cursor)
+
+    _rebuild_with_bot_id(
+        cursor, "admins",
+        "user_id INTEGER NOT NULL, PRIMARY KEY (bot_id, user_id)",
+        "user_id", "WITHOUT ROWID"
+    )
+    _rebuild_with_bot_id(
+        cursor, "subscribers",
+        "chat_id INTEGER NOT NULL, active INTEGER NOT NULL DEFAULT 1, "
+        "subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (bot_id, chat_id)",
+        "chat_id, active, subscribed_at", "WITHOUT ROWID"
+    )
+    _rebuild_with_bot_id(
+        cursor, "persisted_user_data",
+        "user_id INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (bot_id, user_id)",
+        "user_id, data"
+    )
+    _rebuild_with_bot_id(
+        cursor, "persisted_conversations",
+        "name TEXT NOT NULL, key TEXT NOT NULL, state BLOB NOT NULL, PRIMARY KEY (bot_id, name, key)",
+        "name, key, state", "WITHOUT ROWID"
+    )
+
+    cursor.execute("ALTER TABLE broadcasts ADD COLUMN bot_id INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX idx_broadcasts_bot ON broadcasts (bot_id)")
+
+def _add_post_stats(cursor):
+    # View counts per post, added to in batches by view_counter.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_stats (
+            bot_id INTEGER NOT NULL DEFAULT 0,
+            post_id INTEGER NOT NULL,
+            views INTEGER NOT NULL DEFAULT 0,
+            last_viewed_at TIMESTAMP,
+            PRIMARY KEY (bot_id, post_id)
+        ) WITHOUT ROWID
+    ''')
+    # Top posts per bot without sorting every counter
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_post_stats_views ON post_stats (bot_id, views DESC)")
+
+# Applied in order; an entry's 1-based position is the schema version it
+# produces, recorded in PRAGMA user_version. Only ever append to this list.
+MIGRATIONS = [
+    _create_base_schema,
+    _add_post_listing_index,
+    _add_post_search_index,
+    _add_post_revision,
+    _add_broadcasts,
+    _add_persistence,
+    _partition_by_bot,
+    _add_post_stats,
+]
+
+# Files already brought up to date by this process; bots sharing a file
+# would otherwise each take its write lock just to find nothing to do
+_migrated = set()
+
+def migrate(db_path=DEFAULT_DB_NAME):
+    """Brings db_path's file up to the latest schema version and returns that version."""
+    db_file = split_location(db_path)[0]
+    if db_file in _migrated:
+        return len(MIGRATIONS)
+    with get_connection(db_path) as conn:
+        while True:
+            # IMMEDIATE takes the write lock up front, so two processes starting
+            # on the same file apply each migration exactly once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.rollback()
+                    _migrated.add(db_file)
+                    return version
+                MIGRATIONS[version](conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.commit()
+                logging.info(f"Migrated {db_path} to schema version {version + 1}")
+            except Exception:
+                conn.rollback()
+                raise
+
+# --- Batched Writes ---
+
+# A write that can share a transaction with other writes. apply(conn, db_path,
+# *args) makes the change and returns (result, after_commit), where after_commit
+# is None or a callable run once the transaction is committed. If apply raises,
+# the caller gets failed instead, and action names the write in the log.
+WriteOp = namedtuple("WriteOp", ("apply", "action", "failed"))
+
+# PRAGMA synchronous per durability level of a write transaction
+DURABILITY_FULL = "FULL"        # fsync on every commit: survives power loss
+DURABILITY_NORMAL = "NORMAL"    # WAL default: survives a crash of the bot, not of the machine
+DURABILITY_OFF = "OFF"          # no fsync at all: fastest, an OS crash can lose recent commits
+
+def apply_writes(writes, durability=DURABILITY_NORMAL):
+    """Runs writes, a list of (op, db_path, args) on one database file, as a single transaction.
+
+    Each write runs in its own savepoint, so one that fails is rolled back on
+    its own and the others still commit. Returns the raw results in order: the
+    value apply returned, or the exception it raised. after_commit callbacks
+    run once the commit has succeeded.
+    """
+    results = []
+    callbacks = []
+    with get_connection(writes[0][1]) as conn:
+        if durability != DURABILITY_NORMAL:
+            conn.execute(f"PRAGMA synchronous={durability}")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, db_path, args in writes:
+                conn.execute("SAVEPOINT write")
+                try:
+                    result, after_commit = op.apply(conn, db_path, *args)
+                    if after_commit is not None:
+                        callbacks.append(after_commit)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    result = e
+                conn.execute("RELEASE write")
+                results.append(result)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if durability != DURABILITY_NORMAL:
+                conn.execute(f"PRAGMA synchronous={DURABILITY_NORMAL}")
+    for after_commit in callbacks:
+        after_commit()
+    return results
+
+def write_result(op, result):
+    """The caller's view of one raw result from apply_writes."""
+    if isinstance(result, Exception):
+        logging.error(f"Error {op.action}: {result}")
+        return op.failed
+    return result
+
+def run_write(op, db_path, *args):
+    """Runs one write in a transaction of its own."""
     try:
-        cursor.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (initial_admin_id,))
-        conn.commit()
+        return write_result(op, apply_writes([(op, db_path, args)])[0])
     except Exception as e:
-        logging.error(f"Error adding initial admin: {e}")
-        
-    conn.close()
+        return write_result(op, e)
+
+def init_db(initial_admin_id, db_path=DEFAULT_DB_NAME):
+    migrate(db_path)
+
+    bot_id = split_location(db_path)[1]
+    with get_connection(db_path) as conn:
+        # Add initial admin if not exists
+        try:
+            conn.execute("INSERT OR IGNORE INTO admins (bot_id, user_id) VALUES (?, ?)", (bot_id, initial_admin_id))
+            conn.commit()
+        except Exception as e:
+            logging.error(f"Error adding initial admin: {e}")
+
+    get_admin_cache(db_path).refresh(force=True)
 
 def is_admin(user_id, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM admins WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
+    cache = get_admin_cache(db_path)
+    cache.refresh()
+    return user_id in cache.admins.get(split_location(db_path)[1], ())
+
+def _add_admin(conn, db_path, user_id):
+    bot_id = split_location(db_path)[1]
+    conn.execute("INSERT OR IGNORE INTO admins (bot_id, user_id) VALUES (?, ?)", (bot_id, user_id))
+    return True, lambda: get_admin_cache(db_path).admins.setdefault(bot_id, set()).add(user_id)
+
+ADD_ADMIN = WriteOp(_add_admin, "adding admin", False)
 
 def add_admin(user_id, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (user_id,))
-        conn.commit()
-        return True
-    except Exception as e:
-        logging.error(f"Error adding admin: {e}")
-        return False
-    finally:
-        conn.close()
+    return run_write(ADD_ADMIN, db_path, user_id)
+
+def _add_post(conn, db_path, title, description, link, content):
+    bot_id = split_location(db_path)[1]
+    post_id = conn.execute(
+        "INSERT INTO post_ids (bot_id, last_id) VALUES (?, 1) "
+        "ON CONFLICT (bot_id) DO UPDATE SET last_id = last_id + 1 RETURNING last_id",
+        (bot_id,)
+    ).fetchall()[0][0]
+    conn.execute(
+        "INSERT INTO posts (bot_id, id, title, description, link, content) VALUES (?, ?, ?, ?, ?, ?)",
+        (bot_id, post_id, title, description, link, content)
+    )
+    # The new post's id, which is always truthy
+    return post_id, lambda: _post_changed(db_path, post_id, (title, description, link, content))
+
+ADD_POST = WriteOp(_add_post, "adding post", False)
 
 def add_post(title, description, link, content, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO posts (title, description, link, content) VALUES (?, ?, ?, ?)",
-            (title, description, link, content)
-        )
-        conn.commit()
-        return True
-    except Exception as e:
-        logging.error(f"Error adding post: {e}")
-        return False
-    finally:
-        conn.close()
+    return run_write(ADD_POST, db_path, title, description, link, content)
+
+def _import_posts(conn, db_path, posts):
+    # posts are (title, description, link, content, created_at) tuples; a
+    # created_at of None means now. The whole chunk takes one range of ids.
+    bot_id = split_location(db_path)[1]
+    last_id = conn.execute(
+        "INSERT INTO post_ids (bot_id, last_id) VALUES (?, ?) "
+        "ON CONFLICT (bot_id) DO UPDATE SET last_id = last_id + excluded.last_id RETURNING last_id",
+        (bot_id, len(posts))
+    ).fetchall()[0][0]
+    first_id = last_id - len(posts) + 1
+    conn.executemany(
+        "INSERT INTO posts (bot_id, id, title, description, link, content, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+        [(bot_id, first_id + i) + tuple(post) for i, post in enumerate(posts)]
+    )
+
+    def notify():
+        for i, post in enumerate(posts):
+            _post_changed(db_path, first_id + i, tuple(post[:4]))
+
+    return len(posts), notify
+
+# Returns how many posts were imported; 0 when the chunk failed as a whole
+IMPORT_POSTS = WriteOp(_import_posts, "importing posts", 0)
+
+def import_posts(posts, db_path=DEFAULT_DB_NAME):
+    return run_write(IMPORT_POSTS, db_path, posts)
+
+def list_posts_after(after_id, limit, db_path=DEFAULT_DB_NAME):
+    """Returns up to limit full post rows with ids above after_id, in id order.
+
+    Lets an export walk every post a page at a time instead of loading them all.
+    """
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT id, title, description, link, content, created_at FROM posts "
+            "WHERE bot_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (split_location(db_path)[1], after_id, limit)
+        ).fetchall()
 
 def get_all_posts(db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    # Get latest posts first
-    cursor.execute("SELECT id, title, description, link, content, created_at FROM posts ORDER BY created_at DESC")
-    posts = cursor.fetchall()
-    conn.close()
-    return posts
+    with get_connection(db_path) as conn:
+        # Get latest posts first
+        return conn.execute(
+            "SELECT id, title, description, link, content, created_at FROM posts WHERE bot_id = ? "
+            "ORDER BY created_at DESC, id DESC",
+            (split_location(db_path)[1],)
+        ).fetchall()
+
+def list_post_summaries(db_path=DEFAULT_DB_NAME):
+    """Returns (id, title, description, link) for every post, oldest first."""
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT id, title, description, link FROM posts WHERE bot_id = ? ORDER BY id",
+            (split_location(db_path)[1],)
+        ).fetchall()
+
+def list_post_headers_page(older_than=None, newer_than=None, limit=POSTS_PAGE_SIZE, db_path=DEFAULT_DB_NAME):
+    """Returns one PostPage of headers, latest first.
+
+    Pages are addressed by (created_at, id) cursors: pass the last header shown
+    as older_than for the next page, or the first one as newer_than for the
+    previous page. Each page is a single indexed range scan.
+    """
+    bot_id = split_location(db_path)[1]
+    with get_connection(db_path) as conn:
+        if newer_than is not None:
+            rows = conn.execute(
+                "SELECT id, title, created_at FROM posts WHERE bot_id = ? AND (created_at, id) > (?, ?) "
+                "ORDER BY created_at, id LIMIT ?",
+                (bot_id, newer_than[0], newer_than[1], limit + 1)
+            ).fetchall()
+            has_newer = len(rows) > limit
+            rows = rows[:limit][::-1]
+            has_older = True
+        else:
+            if older_than is not None:
+                rows = conn.execute(
+                    "SELECT id, title, created_at FROM posts WHERE bot_id = ? AND (created_at, id) < (?, ?) "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (bot_id, older_than[0], older_than[1], limit + 1)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT id, title, created_at FROM posts WHERE bot_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (bot_id, limit + 1)
+                ).fetchall()
+            has_older = len(rows) > limit
+            rows = rows[:limit]
+            has_newer = older_than is not None
+    return PostPage(list(map(PostHeader._make, rows)), has_newer, has_older)
+
+def make_search_query(text):
+    """Turns free text into an FTS5 query, or returns None if it has no words.
+
+    Each word is quoted, so FTS5 operators typed by users are taken literally,
+    and matched as a prefix; all words must match.
+    """
+    terms = re.findall(r"\w+", text.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+def search_posts(text, offset=0, limit=SEARCH_PAGE_SIZE, db_path=DEFAULT_DB_NAME):
+    """Returns one SearchPage of headers for posts matching text, best match first.
+
+    Matches are ranked with BM25 within the newest SEARCH_RANK_WINDOW hits.
+    """
+    match = make_search_query(text)
+    if match is None:
+        return SearchPage([], False)
+    bot_id = split_location(db_path)[1]
+    # The words are only looked up in the text columns, never in bot_id. The
+    # bot_id phrase keeps the rank window to this bot's posts in a shared file;
+    # the join's bot_id check is what guarantees no other bot's post is returned.
+    match = f'bot_id : "{bot_id}" AND {{title description content}} : ({match})'
+    with get_connection(db_path) as conn:
+        rows = conn.execute(
+            "SELECT posts.id, posts.title, posts.created_at FROM ("
+            "    SELECT rowid, rank FROM posts_fts WHERE posts_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+            ") AS hits JOIN posts ON posts.row_id = hits.rowid AND posts.bot_id = ? "
+            "ORDER BY hits.rank LIMIT ? OFFSET ?",
+            (match, SEARCH_RANK_WINDOW, bot_id, limit + 1, offset)
+        ).fetchall()
+    return SearchPage(list(map(PostHeader._make, rows[:limit])), len(rows) > limit)
+
+def count_posts(db_path=DEFAULT_DB_NAME):
+    with get_connection(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM posts WHERE bot_id = ?", (split_location(db_path)[1],)).fetchone()[0]
 
 def get_post(post_id, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, description, link, content, created_at FROM posts WHERE id = ?", (post_id,))
-    post = cursor.fetchone()
-    conn.close()
-    return post
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT id, title, description, link, content, created_at FROM posts WHERE bot_id = ? AND id = ?",
+            (split_location(db_path)[1], post_id)
+        ).fetchone()
+
+def get_post_for_edit(post_id, db_path=DEFAULT_DB_NAME):
+    """Returns the editable columns of a post plus its revision as a dict, or None."""
+    with get_connection(db_path) as conn:
+        row = conn.execute(
+            "SELECT title, description, link, content, revision FROM posts WHERE bot_id = ? AND id = ?",
+            (split_location(db_path)[1], post_id)
+        ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(EDITABLE_POST_COLUMNS + ("revision",), row))
+
+def update_post_fields(post_id, changes, expected_revision, db_path=DEFAULT_DB_NAME):
+    """Writes only the columns in changes, provided the post is still at expected_revision.
+
+    Returns EDIT_SAVED, EDIT_UNCHANGED when there was nothing to write,
+    EDIT_CONFLICT when the post was edited or deleted since it was read, or
+    EDIT_FAILED.
+    """
+    if not changes:
+        return EDIT_UNCHANGED
+    check_editable(changes)
+    return run_write(UPDATE_POST_FIELDS, db_path, post_id, changes, expected_revision)
+
+def check_editable(changes):
+    unknown = set(changes) - set(EDITABLE_POST_COLUMNS)
+    if unknown:
+        raise ValueError(f"Not editable: {', '.join(sorted(unknown))}")
+
+def _update_post_fields(conn, db_path, post_id, changes, expected_revision):
+    bot_id = split_location(db_path)[1]
+    assignments = ", ".join(f"{column} = ?" for column in changes)
+    cursor = conn.execute(
+        f"UPDATE posts SET {assignments}, revision = revision + 1 WHERE bot_id = ? AND id = ? AND revision = ?",
+        (*changes.values(), bot_id, post_id, expected_revision)
+    )
+    if cursor.rowcount == 0:
+        return EDIT_CONFLICT, None
+    post = conn.execute(
+        "SELECT title, description, link, content FROM posts WHERE bot_id = ? AND id = ?", (bot_id, post_id)
+    ).fetchone()
+    return EDIT_SAVED, lambda: _post_changed(db_path, post_id, post)
+
+UPDATE_POST_FIELDS = WriteOp(_update_post_fields, "updating post", EDIT_FAILED)
+
+def _update_post(conn, db_path, post_id, title, description, link, content):
+    conn.execute(
+        "UPDATE posts SET title = ?, description = ?, link = ?, content = ?, revision = revision + 1 "
+        "WHERE bot_id = ? AND id = ?",
+        (title, description, link, content, split_location(db_path)[1], post_id)
+    )
+    return True, lambda: _post_changed(db_path, post_id, (title, description, link, content))
+
+UPDATE_POST = WriteOp(_update_post, "updating post", False)
 
 def update_post(post_id, title, description, link, content, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE posts SET title = ?, description = ?, link = ?, content = ? WHERE id = ?",
-            (title, description, link, content, post_id)
-        )
-        conn.commit()
-        return True
-    except Exception as e:
-        logging.error(f"Error updating post: {e}")
-        return False
-    finally:
-        conn.close()
+    return run_write(UPDATE_POST, db_path, post_id, title, description, link, content)
+
+def _delete_post(conn, db_path, post_id):
+    bot_id = split_location(db_path)[1]
+    conn.execute("DELETE FROM posts WHERE bot_id = ? AND id = ?", (bot_id, post_id))
+    conn.execute("DELETE FROM post_stats WHERE bot_id = ? AND post_id = ?", (bot_id, post_id))
+    return True, lambda: _post_changed(db_path, post_id, None)
+
+DELETE_POST = WriteOp(_delete_post, "deleting post", False)
 
 def delete_post(post_id, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    return run_write(DELETE_POST, db_path, post_id)
+
+# --- Subscribers and Broadcasts ---
+
+def add_subscriber(chat_id, db_path=DEFAULT_DB_NAME):
     try:
-        cursor.execute("DELETE FROM posts WHERE id = ?", (post_id,))
-        conn.commit()
+        with get_connection(db_path) as conn, conn:
+            conn.execute(
+                "INSERT INTO subscribers (bot_id, chat_id) VALUES (?, ?) "
+                "ON CONFLICT (bot_id, chat_id) DO UPDATE SET active = 1",
+                (split_location(db_path)[1], chat_id)
+            )
         return True
     except Exception as e:
-        logging.error(f"Error deleting post: {e}")
+        logging.error(f"Error adding subscriber: {e}")
         return False
-    finally:
-        conn.close()
+
+def list_subscribers(db_path=DEFAULT_DB_NAME):
+    """Returns the chat ids of all active subscribers."""
+    with get_connection(db_path) as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT chat_id FROM subscribers WHERE bot_id = ? AND active = 1", (split_location(db_path)[1],)
+        )]
+
+def _create_broadcast(conn, bot_id, post_id, notify_chat_id):
+    # A broadcast row plus one job per active subscriber, in the caller's transaction
+    broadcast_id = conn.execute(
+        "INSERT INTO broadcasts (bot_id, post_id, notify_chat_id, created_at) VALUES (?, ?, ?, ?)",
+        (bot_id, post_id, notify_chat_id, time.time())
+    ).lastrowid
+    total = conn.execute(
+        "INSERT INTO broadcast_jobs (broadcast_id, chat_id) "
+        "SELECT ?, chat_id FROM subscribers WHERE bot_id = ? AND active = 1",
+        (broadcast_id, bot_id)
+    ).rowcount
+    conn.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (total, broadcast_id))
+    return broadcast_id
+
+def _publish_post(conn, db_path, title, description, link, content, notify_chat_id):
+    # The post and its broadcast commit together, so a crash can never leave
+    # a new post that start() will not announce
+    post_id, after_commit = _add_post(conn, db_path, title, description, link, content)
+    broadcast_id = _create_broadcast(conn, split_location(db_path)[1], post_id, notify_chat_id)
+    return (post_id, broadcast_id), after_commit
+
+# Returns (post_id, broadcast_id)
+PUBLISH_POST = WriteOp(_publish_post, "publishing post", (None, None))
+
+def publish_post(title, description, link, content, notify_chat_id=None, db_path=DEFAULT_DB_NAME):
+    """Adds a post and queues it for every active subscriber in one transaction."""
+    return run_write(PUBLISH_POST, db_path, title, description, link, content, notify_chat_id)
+
+def start_broadcast(broadcast_id, db_path=DEFAULT_DB_NAME):
+    with get_connection(db_path) as conn, conn:
+        conn.execute(
+            "UPDATE broadcasts SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ?",
+            (time.time(), broadcast_id)
+        )
+
+def claim_broadcast_jobs(broadcast_id, after_chat_id, limit, db_path=DEFAULT_DB_NAME):
+    """Returns up to limit pending (chat_id, attempts) jobs with chat_id above after_chat_id."""
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT chat_id, attempts FROM broadcast_jobs "
+            "WHERE broadcast_id = ? AND status = 0 AND chat_id > ? ORDER BY chat_id LIMIT ?",
+            (broadcast_id, after_chat_id, limit)
+        ).fetchall()
+
+def record_broadcast_results(broadcast_id, results, db_path=DEFAULT_DB_NAME):
+    """Stores one batch of send results in a single transaction.
+
+    results maps chat_id to a JOB_* state; JOB_PENDING means "try again later"
+    and counts an attempt. Blocked chats are unsubscribed.
+    """
+    bot_id = split_location(db_path)[1]
+    counts = {state: 0 for state in (JOB_SENT, JOB_FAILED, JOB_BLOCKED)}
+    for state in results.values():
+        if state in counts:
+            counts[state] += 1
+    with get_connection(db_path) as conn, conn:
+        conn.executemany(
+            "UPDATE broadcast_jobs SET status = ?, attempts = attempts + 1 WHERE broadcast_id = ? AND chat_id = ?",
+            ((state, broadcast_id, chat_id) for chat_id, state in results.items())
+        )
+        conn.executemany(
+            "UPDATE subscribers SET active = 0 WHERE bot_id = ? AND chat_id = ?",
+            ((bot_id, chat_id) for chat_id, state in results.items() if state == JOB_BLOCKED)
+        )
+        conn.execute(
+            "UPDATE broadcasts SET sent = sent + ?, failed = failed + ?, blocked = blocked + ? WHERE id = ?",
+            (counts[JOB_SENT], counts[JOB_FAILED], counts[JOB_BLOCKED], broadcast_id)
+        )
+
+def finish_broadcast(broadcast_id, status="done", db_path=DEFAULT_DB_NAME):
+    """Marks a broadcast finished; any jobs still pending count as failed."""
+    with get_connection(db_path) as conn, conn:
+        left = conn.execute(
+            "UPDATE broadcast_jobs SET status = 2 WHERE broadcast_id = ? AND status = 0", (broadcast_id,)
+        ).rowcount
+        conn.execute(
+            "UPDATE broadcasts SET status = ?, failed = failed + ?, finished_at = ? WHERE id = ?",
+            (status, left, time.time(), broadcast_id)
+        )
+
+BROADCAST_COLUMNS = (
+    "id, post_id, notify_chat_id, status, total, sent, failed, blocked, created_at, started_at, finished_at"
+)
+
+def get_broadcast(broadcast_id, db_path=DEFAULT_DB_NAME):
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE bot_id = ? AND id = ?",
+            (split_location(db_path)[1], broadcast_id)
+        ).fetchone()
+
+def list_broadcasts(limit=5, unfinished=False, db_path=DEFAULT_DB_NAME):
+    """Returns the latest broadcasts, or every broadcast still to be completed if unfinished."""
+    query = f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE bot_id = ? "
+    bot_id = split_location(db_path)[1]
+    with get_connection(db_path) as conn:
+        if unfinished:
+            return conn.execute(query + "AND status IN ('pending', 'running') ORDER BY id", (bot_id,)).fetchall()
+        return conn.execute(query + "ORDER BY id DESC LIMIT ?", (bot_id, limit)).fetchall()
+
+# --- Post Stats ---
+
+TOP_POSTS_LIMIT = 10
+
+def _add_post_views(conn, db_path, views):
+    # views maps post id -> views to add; a post deleted meanwhile is skipped
+    bot_id = split_location(db_path)[1]
+    conn.executemany(
+        "INSERT INTO post_stats (bot_id, post_id, views, last_viewed_at) "
+        "SELECT ?, ?, ?, CURRENT_TIMESTAMP WHERE EXISTS (SELECT 1 FROM posts WHERE bot_id = ? AND id = ?) "
+        "ON CONFLICT (bot_id, post_id) DO UPDATE SET "
+        "views = views + excluded.views, last_viewed_at = excluded.last_viewed_at",
+        [(bot_id, post_id, count, bot_id, post_id) for post_id, count in views.items()]
+    )
+    return True, None
+
+ADD_POST_VIEWS = WriteOp(_add_post_views, "recording post views", False)
+
+def add_post_views(views, db_path=DEFAULT_DB_NAME):
+    return run_write(ADD_POST_VIEWS, db_path, views)
+
+def list_top_posts(limit=TOP_POSTS_LIMIT, db_path=DEFAULT_DB_NAME):
+    """Returns (id, title, views) for the most viewed posts, most viewed first."""
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT posts.id, posts.title, post_stats.views FROM post_stats "
+            "JOIN posts ON posts.bot_id = post_stats.bot_id AND posts.id = post_stats.post_id "
+            "WHERE post_stats.bot_id = ? ORDER BY post_stats.views DESC, post_stats.post_id LIMIT ?",
+            (split_location(db_path)[1], limit)
+        ).fetchall()
+
+# --- Persistence ---
+
+def load_persisted_user_data(db_path=DEFAULT_DB_NAME):
+    """Returns (user_id, data) rows."""
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT user_id, data FROM persisted_user_data WHERE bot_id = ?", (split_location(db_path)[1],)
+        ).fetchall()
+
+def load_persisted_conversations(name, db_path=DEFAULT_DB_NAME):
+    """Returns (key, state) rows of one ConversationHandler."""
+    with get_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT key, state FROM persisted_conversations WHERE bot_id = ? AND name = ?",
+            (split_location(db_path)[1], name)
+        ).fetchall()
+
+def save_persisted_changes(user_data, conversations, db_path=DEFAULT_DB_NAME):
+    """Writes a batch of persistence changes in one transaction.
+
+    user_data maps user_id to data, conversations maps (name, key) to state;
+    a value of None deletes the row.
+    """
+    bot_id = split_location(db_path)[1]
+    with get_connection(db_path) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO persisted_user_data (bot_id, user_id, data) VALUES (?, ?, ?)",
+            ((bot_id, user_id, data) for user_id, data in user_data.items() if data is not None)
+        )
+        conn.executemany(
+            "DELETE FROM persisted_user_data WHERE bot_id = ? AND user_id = ?",
+            ((bot_id, user_id) for user_id, data in user_data.items() if data is None)
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO persisted_conversations (bot_id, name, key, state) VALUES (?, ?, ?, ?)",
+            ((bot_id, name, key, state) for (name, key), state in conversations.items() if state is not None)
+        )
+        conn.executemany(
+            "DELETE FROM persisted_conversations WHERE bot_id = ? AND name = ? AND key = ?",
+            ((bot_id, name, key) for (name, key), state in conversations.items() if state is None)
+        )
+
+# --- Shared Store ---
+
+# Tables copied by copy_tenant as-is, with the columns that follow bot_id
+TENANT_TABLES = (
+    ("admins", "user_id"),
+    ("subscribers", "chat_id, active, subscribed_at"),
+    ("post_ids", "last_id"),
+    ("post_stats", "post_id, views, last_viewed_at"),
+    ("persisted_user_data", "user_id, data"),
+    ("persisted_conversations", "name, key, state"),
+)
+
+def copy_tenant(source_path, db_path):
+    """Copies everything in the single-bot database source_path to the bot at db_path.
+
+    The copy is one transaction and replaces whatever that bot already had, so
+    an interrupted copy can simply be run again. Post ids are kept. Finished
+    broadcasts are copied without their per-recipient jobs, which are never
+    read again. Returns the number of posts copied.
+    """
+    migrate(source_path)
+    migrate(db_path)
+    bot_id = split_location(db_path)[1]
+    if not bot_id:
+        raise ValueError(f"Not a shared database location: {db_path}")
+
+    with get_connection(db_path) as conn:
+        conn.execute("ATTACH DATABASE ? AS source", (split_location(source_path)[0],))
+        try:
+            with conn:
+                for table, columns in TENANT_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE bot_id = ?", (bot_id,))
+                    conn.execute(
+                        f"INSERT INTO {table} (bot_id, {columns}) SELECT ?, {columns} FROM source.{table}",
+                        (bot_id,)
+                    )
+
+                conn.execute("DELETE FROM posts WHERE bot_id = ?", (bot_id,))
+                posts = conn.execute(
+                    "INSERT INTO posts (bot_id, id, title, description, link, content, created_at, revision) "
+                    "SELECT ?, id, title, description, link, content, created_at, revision FROM source.posts",
+                    (bot_id,)
+                ).rowcount
+
+                conn.execute(
+                    "DELETE FROM broadcast_jobs WHERE broadcast_id IN (SELECT id FROM broadcasts WHERE bot_id = ?)",
+                    (bot_id,)
+                )
+                conn.execute("DELETE FROM broadcasts WHERE bot_id = ?", (bot_id,))
+                # Broadcast ids are global, so each one gets a new id here
+                for broadcast in conn.execute(
+                    "SELECT id, post_id, notify_chat_id, status, total, sent, failed, blocked, created_at, "
+                    "started_at, finished_at FROM source.broadcasts ORDER BY id"
+                ).fetchall():
+                    broadcast_id = conn.execute(
+                        "INSERT INTO broadcasts (bot_id, post_id, notify_chat_id, status, total, sent, failed, "
+                        "blocked, created_at, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (bot_id,) + tuple(broadcast[1:])
+                    ).lastrowid
+                    if broadcast[3] in ("pending", "running"):
+                        conn.execute(
+                            "INSERT INTO broadcast_jobs (broadcast_id, chat_id, status, attempts) "
+                            "SELECT ?, chat_id, status, attempts FROM source.broadcast_jobs WHERE broadcast_id = ?",
+                            (broadcast_id, broadcast[0])
+                        )
+        finally:
+            conn.execute("DETACH DATABASE source")
+
+    # Caches built from this bot's old rows (if any) are out of date
+    with _pools_lock:
+        _post_generations[_db_key(db_path)] = _post_generations.get(_db_key(db_path), 0) + 1
+    get_admin_cache(db_path).refresh(force=True)
+    return posts
 
 # --- Child Bot Management Functions ---
 
 def add_child_bot(token, admin_id, child_db_path, db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO child_bots (token, admin_id, db_path) VALUES (?, ?, ?)",
-            (token, admin_id, child_db_path)
-        )
-        conn.commit()
+        with get_connection(db_path) as conn, conn:
+            conn.execute(
+                "INSERT INTO child_bots (token, admin_id, db_path) VALUES (?, ?, ?)",
+                (token, admin_id, child_db_path)
+            )
         return True
     except Exception as e:
         logging.error(f"Error adding child bot: {e}")
         return False
-    finally:
-        conn.close()
+
+def set_child_bot_db_path(token, child_db_path, db_path=DEFAULT_DB_NAME):
+    with get_connection(db_path) as conn, conn:
+        conn.execute("UPDATE child_bots SET db_path = ? WHERE token = ?", (child_db_path, token))
 
 def get_all_child_bots(db_path=DEFAULT_DB_NAME):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, token, admin_id, db_path, created_at FROM child_bots")
-    bots = cursor.fetchall()
-    conn.close()
-    return bots
+    with get_connection(db_path) as conn:
+        return conn.execute("SELECT id, token, admin_id, db_path, created_at FROM child_bots").fetchall()
@@ -0,0 +1,732 @@
+import html
+import logging
+from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import TelegramError
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    ContextTypes,
+    ConversationHandler,
+    MessageHandler,
+    CallbackQueryHandler,
+    InlineQueryHandler,
+    filters,
+)
+import database
+import async_database
+from broadcaster import Broadcaster
+from menu_cache import MenuCache
+import http_pool
+import import_export
+from import_export import StatusMessage
+import post_cache
+from persistence import SQLitePersistence
+import rate_limiter
+from rate_limiter import SendScheduler
+import view_counter
+from view_counter import ViewCounter
+import write_coalescer
+
+logger = logging.getLogger(__name__)
+
+# Manage Posts paging
+MANAGE_PAGE_SIZE = 20
+MANAGE_TITLE_LENGTH = 60
+
+# Seconds Telegram may reuse an inline answer for the same query
+INLINE_CACHE_TIME = 30
+
+# States for Add Post Conversation
+TITLE, DESCRIPTION, LINK, CONTENT = range(4)
+
+# States for Add Admin Conversation
+NEW_ADMIN_ID = range(1)
+
+# States for Edit Post Conversation
+EDIT_SELECT, EDIT_TITLE, EDIT_DESCRIPTION, EDIT_LINK, EDIT_CONTENT = range(5)
+
+# --- Tenants ---
+
+class Tenant:
+    """Everything the handlers need to serve one bot.
+
+    The handlers in this module are shared by every bot; they find the bot
+    they are serving in context.bot_data['tenant']. A tenant holds only its
+    settings and a few small caches, so one process can host many of them
+    (see tenant_runner.py). The main bot is a subclass that adds child bot
+    management (see bot.py).
+    """
+
+    # Extra menu rows for the bot's Initial Admin
+    admin_buttons = [["Add New Admin"]]
+
+    def __init__(self, token, admin_id, db_path, name=None):
+        self.token = token
+        self.admin_id = admin_id
+        self.db_path = db_path
+        # Label of the bot's send queue in /stats
+        self.name = name or f"child {token.split(':')[0]}"
+        # Rendered reader menu, rebuilt only after post changes
+        self.menu_cache = MenuCache()
+        # Subscribers and new post broadcasts
+        self.broadcaster = Broadcaster(db_path)
+        # Post views, saved to post_stats in batches
+        self.view_counter = ViewCounter(db_path)
+
+    @property
+    def post_cache(self):
+        return post_cache.get_post_cache(self.db_path)
+
+    def conversations(self):
+        """The bot's ConversationHandlers. They keep per-chat state, so every Application gets new ones."""
+        return make_conversations()
+
+    async def start(self, application: Application) -> None:
+        """Loads subscribers, resumes broadcasts interrupted by a crash or restart and starts saving post views."""
+        await self.broadcaster.start(application.bot)
+        self.view_counter.start()
+
+    async def stop(self, application: Application) -> None:
+        """Pauses broadcasts before the bot shuts down; they resume on the next start."""
+        await self.broadcaster.stop()
+        await self.view_counter.stop()
+
+    async def shutdown(self, application: Application) -> None:
+        pass
+
+    def send_metrics(self, bot):
+        """Send queue metrics shown by /stats."""
+        return [bot.rate_limiter.metrics()]
+
+    async def stats_sections(self, bot):
+        """Sections of the /stats reply."""
+        sections = [rate_limiter.format_metrics(metrics) for metrics in self.send_metrics(bot)]
+        sections.append("\n".join(http_pool.format_stats(stats) for stats in http_pool.pool_stats()))
+        sections.append(post_cache.format_stats(self.post_cache.stats()))
+        sections.append(write_coalescer.format_stats(async_database.writes.stats()))
+        sections.append(view_counter.format_stats(self.view_counter.stats()))
+        broadcasts = await self.broadcaster.report()
+        if broadcasts:
+            sections.append("\n".join(broadcasts))
+        return sections
+
+def build_application(tenant):
+    """Creates the Application serving tenant. Its database must already be initialised."""
+    application = (
+        Application.builder()
+        .token(tenant.token)
+        .rate_limiter(SendScheduler(tenant.name))
+        .persistence(SQLitePersistence(tenant.db_path))
+        .request(http_pool.api_request())
+        .get_updates_request(http_pool.polling_request())
+        .post_init(tenant.start)
+        .post_stop(tenant.stop)
+        .post_shutdown(tenant.shutdown)
+        .build()
+    )
+    application.bot_data['tenant'] = tenant
+    for conversation in tenant.conversations():
+        application.add_handler(conversation)
+    application.add_handlers(SHARED_HANDLERS)
+    return application
+
+# --- Menus ---
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Starts the bot and shows options based on user role."""
+    tenant = context.bot_data['tenant']
+    user = update.effective_user
+    user_id = user.id
+    await tenant.broadcaster.subscribe(update.effective_chat.id)
+
+    if await async_database.is_admin(user_id, db_path=tenant.db_path):
+        await show_admin_menu(update, context)
+    else:
+        await show_user_menu(update, context)
+
+async def show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    tenant = context.bot_data['tenant']
+    user_id = update.effective_user.id
+    keyboard = [
+        ["Add New Post", "View All Posts"],
+        ["Manage Posts", "Top Posts"]
+    ]
+
+    # Only the Initial Admin sees "Add New Admin" (and "Add New Bot" on the main bot)
+    if user_id == tenant.admin_id:
+        keyboard.extend(tenant.admin_buttons)
+
+    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    await update.message.reply_text(
+        "Welcome Admin! What would you like to do?",
+        reply_markup=reply_markup
+    )
+
+def make_post_button_row(post_id, title):
+    return [InlineKeyboardButton(title, callback_data=f"view_post_{post_id}")]
+
+def make_page_button(label, callback_prefix, post):
+    # Cursor travels in the callback data: <prefix>_<created_at>_<id>
+    return InlineKeyboardButton(label, callback_data=f"{callback_prefix}_{post.created_at}_{post.id}")
+
+def parse_page_cursor(data):
+    """Splits page callback data into (prefix, direction, (created_at, post_id))."""
+    prefix, direction, created_at, post_id = data.split('_')
+    return prefix, direction, (created_at, int(post_id))
+
+async def get_user_menu_content(context, older_than=None, newer_than=None):
+    """Returns the text and reply_markup for one page of the user menu."""
+    tenant = context.bot_data['tenant']
+    menu_cache = tenant.menu_cache
+    # Served from memory until a post is added, edited or deleted
+    generation = database.get_post_generation(db_path=tenant.db_path)
+    page_key = (older_than, newer_than) if older_than or newer_than else None
+    content = menu_cache.get(generation, page_key)
+    if content is not None:
+        return content
+
+    page = await async_database.list_post_headers_page(older_than, newer_than, db_path=tenant.db_path)
+    if not page.headers:
+        if page_key is not None:
+            # Cursor ran off the end (posts were deleted), start over
+            return await get_user_menu_content(context)
+        content = "Welcome! There are no blog posts yet. Stay tuned!", None
+    else:
+        post_count = menu_cache.get_post_count(generation)
+        if post_count is None:
+            post_count = await async_database.count_posts(db_path=tenant.db_path)
+            menu_cache.store_post_count(generation, post_count)
+
+        keyboard = menu_cache.button_rows(page.headers, make_post_button_row)
+        navigation = []
+        if page.has_newer:
+            navigation.append(make_page_button("« Prev", "menu_newer", page.headers[0]))
+        if page.has_older:
+            navigation.append(make_page_button("Next »", "menu_older", page.headers[-1]))
+        if navigation:
+            keyboard = keyboard + [navigation]
+
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        content = f"Welcome! Here are the latest blog posts ({post_count}). Click a title to read more:", reply_markup
+
+    menu_cache.store(generation, content, page_key)
+    return content
+
+async def show_user_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    text, reply_markup = await get_user_menu_content(context)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+# --- Search ---
+
+async def get_search_page_content(context, text, offset=0):
+    """Returns the text and reply_markup for one page of search results."""
+    tenant = context.bot_data['tenant']
+    page = await async_database.search_posts(text, offset, db_path=tenant.db_path)
+    if not page.headers:
+        if offset:
+            # Posts were deleted since the previous page, start over
+            return await get_search_page_content(context, text)
+        return f"No posts match \"{text}\".", None
+
+    keyboard = tenant.menu_cache.button_rows(page.headers, make_post_button_row)
+    navigation = []
+    if offset:
+        navigation.append(InlineKeyboardButton("« Prev", callback_data=f"search_{max(0, offset - database.SEARCH_PAGE_SIZE)}"))
+    if page.has_more:
+        navigation.append(InlineKeyboardButton("Next »", callback_data=f"search_{offset + len(page.headers)}"))
+    if navigation:
+        keyboard = keyboard + [navigation]
+
+    first, last = offset + 1, offset + len(page.headers)
+    return f"Posts matching \"{text}\" ({first}-{last}), best first:", InlineKeyboardMarkup(keyboard)
+
+async def search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Finds posts by words in their title, description or content: /search <words>."""
+    text = " ".join(context.args)
+    if database.make_search_query(text) is None:
+        await update.message.reply_text("Usage: /search <words>")
+        return
+    # Callback data is too small for the query, so paging reads it back from here
+    context.user_data['search_query'] = text
+    text, reply_markup = await get_search_page_content(context, text)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+# --- Inline Mode ---
+
+def make_inline_result(post_id, title, description, link):
+    message = f"<b>{html.escape(title)}</b>\n\n<i>{html.escape(description or '')}</i>\n\n{html.escape(link or '')}"
+    return InlineQueryResultArticle(
+        id=str(post_id),
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(message, parse_mode="HTML"),
+    )
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answers "@botname words" with matching posts to share into any chat.
+
+    Inline mode has to be switched on for the bot with /setinline in @BotFather.
+    """
+    index = await async_database.get_title_index(db_path=context.bot_data['tenant'].db_path)
+    results = [make_inline_result(*post) for post in index.search(update.inline_query.query)]
+    # Answers do not depend on who asks, so Telegram may serve them to everyone
+    await update.inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+# --- Add Post Conversation ---
+
+async def add_post_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    user_id = update.effective_user.id
+    if not await async_database.is_admin(user_id, db_path=context.bot_data['tenant'].db_path):
+        await update.message.reply_text("You are not authorized to perform this action.")
+        return ConversationHandler.END
+
+    await update.message.reply_text(
+        "Let's create a new blog post.\n"
+        "Please enter the <b>Title</b> of the post:",
+        parse_mode="HTML",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    return TITLE
+
+async def received_title(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data['post_title'] = update.message.text
+    await update.message.reply_text("Got it. Now please enter the <b>Description</b> (short summary):", parse_mode="HTML")
+    return DESCRIPTION
+
+async def received_description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data['post_description'] = update.message.text
+    await update.message.reply_text("Okay. Now please enter the <b>Link</b> to the full post/resource:", parse_mode="HTML")
+    return LINK
+
+async def received_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data['post_link'] = update.message.text
+    await update.message.reply_text("Almost done. Please enter the main <b>Content</b> or details for this post:", parse_mode="HTML")
+    return CONTENT
+
+async def received_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    tenant = context.bot_data['tenant']
+    context.user_data['post_content'] = update.message.text
+
+    # Saved together with its broadcast; subscribers are notified in the
+    # background and the report comes here when done
+    post_id = await tenant.broadcaster.publish_post(
+        context.user_data['post_title'],
+        context.user_data['post_description'],
+        context.user_data['post_link'],
+        context.user_data['post_content'],
+        notify_chat_id=update.effective_chat.id
+    )
+    if not post_id:
+        await update.message.reply_text("Failed to save the post.")
+        await show_admin_menu(update, context)
+        return ConversationHandler.END
+
+    await update.message.reply_text("Blog post created successfully! Sending it to subscribers.")
+    await show_admin_menu(update, context)
+    return ConversationHandler.END
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text("Operation cancelled.")
+    user_id = update.effective_user.id
+    if await async_database.is_admin(user_id, db_path=context.bot_data['tenant'].db_path):
+        await show_admin_menu(update, context)
+    else:
+        await show_user_menu(update, context)
+    return ConversationHandler.END
+
+# --- Add Admin Conversation ---
+
+async def add_admin_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    user_id = update.effective_user.id
+
+    # Check if user is the Initial Admin
+    if user_id != context.bot_data['tenant'].admin_id:
+        await update.message.reply_text("You are not authorized to perform this action. Only the Initial Admin can add new admins.")
+        return ConversationHandler.END
+
+    await update.message.reply_text(
+        "Please enter the <b>Telegram ID</b> of the new admin:\n"
+        "(You can ask them to use @userinfobot to find their ID)",
+        parse_mode="HTML",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    return NEW_ADMIN_ID
+
+async def received_admin_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    try:
+        new_admin_id = int(update.message.text)
+        if await async_database.add_admin(new_admin_id, db_path=context.bot_data['tenant'].db_path):
+            await update.message.reply_text(f"User {new_admin_id} has been added as an admin.")
+        else:
+            await update.message.reply_text("Failed to add admin. They might already be an admin.")
+    except ValueError:
+        await update.message.reply_text("Invalid ID. Please enter a numeric User ID.")
+        return NEW_ADMIN_ID # Ask again
+
+    await show_admin_menu(update, context)
+    return ConversationHandler.END
+
+# --- Manage Posts Handlers ---
+
+async def manage_posts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Lists posts with Edit/Delete buttons."""
+    user_id = update.effective_user.id
+    if not await async_database.is_admin(user_id, db_path=context.bot_data['tenant'].db_path):
+        await update.message.reply_text("You are not authorized to perform this action.")
+        return
+
+    text, reply_markup = await get_manage_page_content(context)
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="HTML")
+
+async def get_manage_page_content(context, older_than=None, newer_than=None, notice=None):
+    """Returns the text and reply_markup for one page of Manage Posts.
+
+    The whole page is a single message with numbered posts and one row of
+    Edit/Delete buttons per post, so opening or paging the view is one request.
+    """
+    page = await async_database.list_post_headers_page(older_than, newer_than, limit=MANAGE_PAGE_SIZE, db_path=context.bot_data['tenant'].db_path)
+    if not page.headers:
+        if older_than or newer_than:
+            return await get_manage_page_content(context, notice=notice)
+        return notice or "No posts to manage.", None
+
+    lines = [notice, ""] if notice else []
+    lines.append("Select a post to manage:")
+    keyboard = []
+    for number, post in enumerate(page.headers, start=1):
+        post_id, title, created_at = post
+        if len(title) > MANAGE_TITLE_LENGTH:
+            title = title[:MANAGE_TITLE_LENGTH - 1] + "…"
+        lines.append(f"{number}. <b>{html.escape(title)}</b> ({created_at})")
+        keyboard.append([
+            InlineKeyboardButton(f"Edit {number}", callback_data=f"edit_{post_id}"),
+            InlineKeyboardButton(f"Delete {number}", callback_data=f"delete_{post_id}")
+        ])
+
+    navigation = []
+    if page.has_newer:
+        navigation.append(make_page_button("« Prev", "manage_newer", page.headers[0]))
+    if page.has_older:
+        navigation.append(make_page_button("Next »", "manage_older", page.headers[-1]))
+    if navigation:
+        keyboard.append(navigation)
+
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def render_post(post_id, db_path):
+    """Loads a post and returns its reader view as (text, reply_markup), or None if it is gone."""
+    post = await async_database.get_post(post_id, db_path=db_path)
+    if not post:
+        return None
+
+    post_id, title, description, link, content, created_at = post
+    # Content is the admin's own HTML; the other fields are plain text
+    message = (
+        f"<b>{html.escape(title)}</b>\n\n"
+        f"<i>{html.escape(description or '')}</i>\n\n"
+        f"{html.escape(link or '')}\n\n"
+        f"{content}"
+    )
+
+    # Add Back button
+    keyboard = [[InlineKeyboardButton("« Back to List", callback_data="back_to_list")]]
+    return message, InlineKeyboardMarkup(keyboard)
+
+async def post_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles Edit, Delete, and View Post button clicks."""
+    tenant = context.bot_data['tenant']
+    query = update.callback_query
+    await query.answer()
+
+    data = query.data
+
+    if data == "back_to_list":
+        text, reply_markup = await get_user_menu_content(context)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+        return
+
+    if data.startswith("menu_"):
+        _, direction, cursor = parse_page_cursor(data)
+        if direction == "older":
+            text, reply_markup = await get_user_menu_content(context, older_than=cursor)
+        else:
+            text, reply_markup = await get_user_menu_content(context, newer_than=cursor)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+        return
+
+    if data.startswith("search_"):
+        if 'search_query' not in context.user_data:
+            await query.edit_message_text("This search has expired. Send /search again.")
+            return
+        offset = int(data.split('_')[1])
+        text, reply_markup = await get_search_page_content(context, context.user_data['search_query'], offset)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+        return
+
+    if data.startswith("manage_"):
+        if not await async_database.is_admin(update.effective_user.id, db_path=tenant.db_path):
+            return
+        _, direction, cursor = parse_page_cursor(data)
+        if direction == "older":
+            text, reply_markup = await get_manage_page_content(context, older_than=cursor)
+        else:
+            text, reply_markup = await get_manage_page_content(context, newer_than=cursor)
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="HTML")
+        return
+
+    if data.startswith("view_post_"):
+        _, _, post_id = data.split('_')
+        post_id = int(post_id)
+        # Rendered once per revision; concurrent clicks on a fresh post share one read
+        content = await tenant.post_cache.get_or_load(post_id, lambda: render_post(post_id, tenant.db_path))
+        if content is None:
+            await query.edit_message_text("This post no longer exists.")
+            return
+
+        # Counted in memory; saved to post_stats in the background
+        tenant.view_counter.record(post_id)
+        message, reply_markup = content
+        await query.edit_message_text(text=message, parse_mode="HTML", reply_markup=reply_markup)
+        return
+
+    action, post_id = data.split('_')
+    post_id = int(post_id)
+
+    if action == "delete":
+        if await async_database.delete_post(post_id, db_path=tenant.db_path):
+            notice = "Post deleted successfully."
+        else:
+            notice = "Failed to delete post."
+        # Refresh the Manage Posts message in place
+        text, reply_markup = await get_manage_page_content(context, notice=notice)
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="HTML")
+
+    elif action == "edit":
+        pass # Handled by ConversationHandler entry points
+
+async def top_posts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Lists the most viewed posts with their view counts."""
+    tenant = context.bot_data['tenant']
+    if not await async_database.is_admin(update.effective_user.id, db_path=tenant.db_path):
+        await update.message.reply_text("You are not authorized to perform this action.")
+        return
+
+    # Include the views still buffered in memory
+    await tenant.view_counter.flush()
+    posts = await async_database.list_top_posts(db_path=tenant.db_path)
+    if not posts:
+        await update.message.reply_text("No post has been viewed yet.")
+        return
+
+    lines = ["Most viewed posts:"]
+    keyboard = []
+    for number, (post_id, title, views) in enumerate(posts, start=1):
+        if len(title) > MANAGE_TITLE_LENGTH:
+            title = title[:MANAGE_TITLE_LENGTH - 1] + "…"
+        lines.append(f"{number}. <b>{html.escape(title)}</b> ({views} views)")
+        keyboard.append(make_post_button_row(post_id, f"{number}. {title}"))
+    await update.message.reply_text("\n".join(lines), reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="HTML")
+
+# --- Edit Post Conversation ---
+
+async def edit_post_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+
+    data = query.data
+    _, post_id = data.split('_')
+
+    # Read the post once; the later steps compare against this snapshot
+    snapshot = await async_database.get_post_for_edit(int(post_id), db_path=context.bot_data['tenant'].db_path)
+    if not snapshot:
+        await query.edit_message_text("Post not found.")
+        return ConversationHandler.END
+
+    context.user_data['edit_post_id'] = int(post_id)
+    context.user_data['edit_snapshot'] = snapshot
+    context.user_data['edit_changes'] = {}
+
+    await query.edit_message_text(
+        f"Editing Post: <b>{html.escape(snapshot['title'])}</b>\n\n"
+        "Please enter the new <b>Title</b> (or send . to keep current):",
+        parse_mode="HTML"
+    )
+    return EDIT_TITLE
+
+def record_edit(context, column, text):
+    """Remembers a new value for column unless it is '.' or equal to the current one."""
+    if text != '.' and text != context.user_data['edit_snapshot'][column]:
+        context.user_data['edit_changes'][column] = text
+
+async def edit_received_title(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    record_edit(context, 'title', update.message.text)
+    await update.message.reply_text("Enter new <b>Description</b> (or . to keep current):", parse_mode="HTML")
+    return EDIT_DESCRIPTION
+
+async def edit_received_description(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    record_edit(context, 'description', update.message.text)
+    await update.message.reply_text("Enter new <b>Link</b> (or . to keep current):", parse_mode="HTML")
+    return EDIT_LINK
+
+async def edit_received_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    record_edit(context, 'link', update.message.text)
+    await update.message.reply_text("Enter new <b>Content</b> (or . to keep current):", parse_mode="HTML")
+    return EDIT_CONTENT
+
+async def edit_received_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    record_edit(context, 'content', update.message.text)
+
+    # Only the changed columns are written, and only if nobody else edited the post meanwhile
+    result = await async_database.update_post_fields(
+        context.user_data['edit_post_id'],
+        context.user_data['edit_changes'],
+        context.user_data['edit_snapshot']['revision'], db_path=context.bot_data['tenant'].db_path
+    )
+    for key in ('edit_post_id', 'edit_snapshot', 'edit_changes'):
+        context.user_data.pop(key, None)
+
+    if result == database.EDIT_SAVED:
+        await update.message.reply_text("Post updated successfully!")
+    elif result == database.EDIT_UNCHANGED:
+        await update.message.reply_text("Nothing changed, the post was left as it was.")
+    elif result == database.EDIT_CONFLICT:
+        await update.message.reply_text(
+            "Another admin changed or deleted this post while you were editing it, "
+            "so your changes were not saved. Open it again from Manage Posts to retry."
+        )
+    else:
+        await update.message.reply_text("Failed to update post.")
+    await show_admin_menu(update, context)
+    return ConversationHandler.END
+
+# --- Import / Export ---
+
+IMPORT_USAGE = (
+    "Send a .jsonl or .csv file of posts with the caption /import, "
+    "or reply /import to one you already sent.\n"
+    "Each post needs a title; description, link, content and created_at are optional."
+)
+
+async def import_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Adds every post in an uploaded JSONL or CSV document, reporting progress in one message."""
+    tenant = context.bot_data['tenant']
+    message = update.message
+    if not await async_database.is_admin(update.effective_user.id, db_path=tenant.db_path):
+        await message.reply_text("You are not authorized to perform this action.")
+        return
+
+    document = message.document
+    if document is None and message.reply_to_message:
+        document = message.reply_to_message.document
+    if document is None or import_export.file_format(document.file_name) is None:
+        await message.reply_text(IMPORT_USAGE)
+        return
+    if document.file_size and document.file_size > import_export.IMPORT_MAX_BYTES:
+        await message.reply_text("That file is too large; Telegram lets bots download files of up to 20 MB. Split it and import the parts.")
+        return
+
+    status = StatusMessage(await message.reply_text("Starting import…"))
+    try:
+        summary = await import_export.import_document(context.bot, document, tenant.db_path, status)
+    except TelegramError as e:
+        logger.error(f"Error downloading import file: {e}")
+        summary = "Could not download the file. Please try again."
+    await status.update(summary, final=True)
+
+async def export_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sends every post back as a document: /export for JSONL, /export csv for CSV."""
+    tenant = context.bot_data['tenant']
+    if not await async_database.is_admin(update.effective_user.id, db_path=tenant.db_path):
+        await update.message.reply_text("You are not authorized to perform this action.")
+        return
+
+    file_format = import_export.FORMAT_JSONL
+    if context.args:
+        file_format = import_export.file_format(f".{context.args[0]}")
+        if file_format is None:
+            await update.message.reply_text("Usage: /export [jsonl|csv]")
+            return
+
+    status = StatusMessage(await update.message.reply_text("Exporting posts…"))
+    try:
+        await import_export.send_export(context.bot, update.effective_chat.id, file_format, tenant.db_path, status)
+    except TelegramError as e:
+        logger.error(f"Error sending export: {e}")
+        await status.update("Could not send the export. Please try again.", final=True)
+
+# --- Stats Handler ---
+async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Shows the bot's send queue, HTTP pool, post cache and broadcast metrics to its Initial Admin."""
+    tenant = context.bot_data['tenant']
+    if update.effective_user.id != tenant.admin_id:
+        return
+    sections = await tenant.stats_sections(context.bot)
+    await update.message.reply_text("\n\n".join(sections) or "No stats yet.")
+
+# --- View Posts Handler (for Admin menu) ---
+async def view_posts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await show_user_menu(update, context)
+    # If admin, show menu again after listing posts so they don't get stuck
+    if await async_database.is_admin(update.effective_user.id, db_path=context.bot_data['tenant'].db_path):
+        await show_admin_menu(update, context)
+
+# --- Handler registration ---
+
+def make_conversations():
+    """New ConversationHandlers for the flows every bot has."""
+    # Add Post Conversation
+    add_post_conv = ConversationHandler(
+        entry_points=[MessageHandler(filters.Regex("^Add New Post$"), add_post_start)],
+        states={
+            TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_title)],
+            DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_description)],
+            LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_link)],
+            CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_content)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        # Survives restarts, so half-finished flows can be picked up again
+        name="add_post",
+        persistent=True,
+    )
+
+    # Add Admin Conversation
+    add_admin_conv = ConversationHandler(
+        entry_points=[MessageHandler(filters.Regex("^Add New Admin$"), add_admin_start)],
+        states={
+            NEW_ADMIN_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_admin_id)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="add_admin",
+        persistent=True,
+    )
+
+    # Edit Post Conversation
+    edit_post_conv = ConversationHandler(
+        entry_points=[CallbackQueryHandler(edit_post_start, pattern="^edit_")],
+        states={
+            EDIT_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_title)],
+            EDIT_DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_description)],
+            EDIT_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_link)],
+            EDIT_CONTENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_received_content)],
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="edit_post",
+        persistent=True,
+    )
+    return [add_post_conv, add_admin_conv, edit_post_conv]
+
+# Stateless handlers, built once and shared by every tenant's Application
+SHARED_HANDLERS = [
+    MessageHandler(filters.Regex("^Manage Posts$"), manage_posts_handler),
+    CallbackQueryHandler(post_action_callback, pattern="^delete_|^view_post_|^back_to_list$|^menu_|^manage_|^search_"),
+    MessageHandler(filters.Regex("^View All Posts$"), view_posts_handler),
+    MessageHandler(filters.Regex("^Top Posts$"), top_posts_handler),
+    CommandHandler("start", start),
+    CommandHandler("stats", stats_handler),
+    CommandHandler("search", search_handler),
+    CommandHandler("import", import_handler),
+    # A document sent with /import as its caption
+    MessageHandler(filters.Document.ALL & filters.CaptionRegex(r"^/import(@\w+)?\s*$"), import_handler),
+    CommandHandler("export", export_handler),
+    InlineQueryHandler(inline_query_handler),
+]
@@ -0,0 +1,109 @@
+import time
+
+from telegram.error import TimedOut
+from telegram.request import HTTPXRequest
+
+# Connections shared by the Bot API calls of every bot in the process
+API_POOL_SIZE = 64
+# Connections shared by getUpdates long polls. Over HTTP/1.1 each polling bot
+# holds one for the length of a poll; over HTTP/2 they are multiplexed.
+POLLING_POOL_SIZE = 1024
+# Seconds a request may wait for a free connection
+POOL_TIMEOUT = 5.0
+
+def http2_available():
+    """HTTP/2 needs the optional h2 package (python-telegram-bot[http2])."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class SharedHTTPXRequest(HTTPXRequest):
+    """An HTTPXRequest that many Bot instances can use at the same time.
+
+    Every bot that uses it initialises and shuts it down. The keep-alive
+    connections are only closed when the last bot lets go, so bots reuse each
+    other's TLS sessions. It also counts requests in flight for sizing the pool.
+    """
+
+    def __init__(self, name, connection_pool_size, **kwargs):
+        http_version = "2" if http2_available() else "1.1"
+        super().__init__(connection_pool_size=connection_pool_size, http_version=http_version, **kwargs)
+        self.name = name
+        self.pool_size = connection_pool_size
+        self._users = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.pool_timeouts = 0
+        self.total_time = 0.0
+
+    async def initialize(self):
+        self._users += 1
+        await super().initialize()
+
+    async def shutdown(self):
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            await super().shutdown()
+
+    async def do_request(self, *args, **kwargs):
+        self.requests += 1
+        self.in_flight += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+        started = time.monotonic()
+        try:
+            return await super().do_request(*args, **kwargs)
+        except TimedOut as exc:
+            if "Pool timeout" in str(exc):
+                self.pool_timeouts += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_time += time.monotonic() - started
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "http_version": self.http_version,
+            "bots": self._users,
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilisation": self.in_flight / self.pool_size,
+            "requests": self.requests,
+            "pool_timeouts": self.pool_timeouts,
+            "avg_time": self.total_time / self.requests if self.requests else 0.0,
+        }
+
+_shared_requests = {}
+
+def api_request():
+    """The process-wide request pool for ordinary Bot API calls."""
+    request = _shared_requests.get("api")
+    if request is None:
+        request = SharedHTTPXRequest("api", API_POOL_SIZE, pool_timeout=POOL_TIMEOUT)
+        _shared_requests["api"] = request
+    return request
+
+def polling_request():
+    """The process-wide request pool for getUpdates."""
+    request = _shared_requests.get("polling")
+    if request is None:
+        request = SharedHTTPXRequest("polling", POLLING_POOL_SIZE, pool_timeout=POOL_TIMEOUT)
+        _shared_requests["polling"] = request
+    return request
+
+def pool_stats():
+    return [request.stats() for request in _shared_requests.values()]
+
+def format_stats(stats):
+    """Renders one pool's stats as a line of plain text."""
+    return (
+        f"HTTP pool ({stats['name']}, HTTP/{stats['http_version']}): {stats['bots']} bots, "
+        f"{stats['in_flight']}/{stats['pool_size']} in use ({stats['utilisation']:.0%}), "
+        f"peak {stats['peak_in_flight']}, {stats['requests']} requests, "
+        f"avg {stats['avg_time']:.3f}s, {stats['pool_timeouts']} pool timeouts"
+    )
@@ -0,0 +1,310 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from telegram.error import TelegramError
+
+import async_database
+
+# Posts written per transaction while importing
+IMPORT_CHUNK_SIZE = 500
+# Posts read per query while exporting
+EXPORT_CHUNK_SIZE = 500
+
+# Telegram only lets bots download files up to 20 MB
+IMPORT_MAX_BYTES = 20 * 1024 * 1024
+# Longest single CSV field accepted (post content can exceed csv's 128 KB default)
+CSV_FIELD_LIMIT = 4 * 1024 * 1024
+# Problem lines quoted in the import summary; the rest are only counted
+IMPORT_ERROR_SAMPLES = 5
+# Characters read at a time from a file holding one JSON array
+JSON_READ_SIZE = 64 * 1024
+
+# Seconds between edits of the status message
+PROGRESS_INTERVAL = 2.0
+
+# Columns of an export, in order. Imports read the same names; id is ignored
+# and the post gets a new one.
+EXPORT_COLUMNS = ("id", "title", "description", "link", "content", "created_at")
+
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+
+_FORMATS_BY_EXTENSION = {
+    ".jsonl": FORMAT_JSONL,
+    ".ndjson": FORMAT_JSONL,
+    # Either JSON Lines or one array of posts; PostReader tells them apart
+    ".json": FORMAT_JSONL,
+    ".csv": FORMAT_CSV,
+}
+
+def file_format(file_name):
+    """FORMAT_JSONL or FORMAT_CSV for an uploaded file name, or None if it is neither."""
+    return _FORMATS_BY_EXTENSION.get(os.path.splitext(file_name or "")[1].lower())
+
+# --- Status Message ---
+
+class StatusMessage:
+    """One message edited in place to report the progress of a long job.
+
+    Edits are spaced PROGRESS_INTERVAL apart so a fast job does not spend its
+    send budget on progress reports.
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self._text = message.text
+        self._shown_at = time.monotonic()
+
+    async def update(self, text, final=False):
+        if text == self._text:
+            return
+        if not final and time.monotonic() - self._shown_at < PROGRESS_INTERVAL:
+            return
+        try:
+            await self.message.edit_text(text)
+        except TelegramError as e:
+            logging.error(f"Error updating status message: {e}")
+        self._text = text
+        self._shown_at = time.monotonic()
+
+# --- Import ---
+
+def _text(record, column):
+    value = record.get(column)
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+def _created_at(value):
+    """Normalises an imported timestamp to the posts table's UTC 'YYYY-MM-DD HH:MM:SS'."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_post(record):
+    """Turns one imported record into a (title, description, link, content, created_at) row.
+
+    Raises ValueError if the record cannot be a post.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    title = _text(record, "title").strip()
+    if not title:
+        raise ValueError("no title")
+    return (
+        title,
+        _text(record, "description"),
+        _text(record, "link"),
+        _text(record, "content"),
+        _created_at(record.get("created_at")),
+    )
+
+class PostReader:
+    """Reads posts from an uploaded JSONL or CSV file, one chunk at a time.
+
+    JSONL has one object per line, or the whole file is one JSON array of
+    objects; CSV needs a header row. All use the EXPORT_COLUMNS names, of
+    which only title is required. Records that are not valid posts are
+    skipped and counted.
+    """
+
+    def __init__(self, path, file_format):
+        # utf-8-sig drops the byte order mark spreadsheet programs put in front of CSV
+        self._file = open(path, newline="", encoding="utf-8-sig")
+        if file_format == FORMAT_CSV:
+            csv.field_size_limit(CSV_FIELD_LIMIT)
+            self._records = self._csv_records()
+        else:
+            self._records = self._json_records()
+        self.skipped = 0
+        self.errors = []
+        self._unreadable = None
+
+    def _json_records(self):
+        starts_array = self._file.read(JSON_READ_SIZE).lstrip().startswith("[")
+        self._file.seek(0)
+        if starts_array:
+            yield from self._json_array_records()
+        else:
+            yield from self._jsonl_records()
+
+    def _jsonl_records(self):
+        for line_number, line in enumerate(self._file, start=1):
+            if line.strip():
+                yield f"line {line_number}", lambda line=line: json.loads(line)
+
+    def _json_array_records(self):
+        # Decodes one element at a time, so only the current post is held in memory.
+        # Past a syntax error there is no telling where the next element starts,
+        # so the rest of the file is given up with a JSONDecodeError.
+        decoder = json.JSONDecoder()
+        buffer = self._file.read(JSON_READ_SIZE).lstrip()[1:]
+        number = 0
+        expect_element = True
+        while True:
+            buffer = buffer.lstrip()
+            if buffer:
+                if buffer[0] == "]" and (number == 0 or not expect_element):
+                    return
+                if not expect_element:
+                    if buffer[0] != ",":
+                        raise json.JSONDecodeError(f"record {number}: expected ',' or ']' after it", buffer, 0)
+                    buffer = buffer[1:]
+                    expect_element = True
+                    continue
+                try:
+                    record, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    end = None
+                # An element running up to the end of the buffer may be cut short, e.g. a number
+                if end is not None and end < len(buffer):
+                    number += 1
+                    buffer = buffer[end:]
+                    expect_element = False
+                    yield f"record {number}", lambda record=record: record
+                    continue
+            # Reading at least as much again as is buffered keeps a long element linear
+            data = self._file.read(max(JSON_READ_SIZE, len(buffer)))
+            if not data:
+                message = "the file ends inside the array"
+                if buffer and expect_element:
+                    try:
+                        decoder.raw_decode(buffer)
+                    except json.JSONDecodeError as e:
+                        message = e.msg
+                raise json.JSONDecodeError(f"record {number + 1}: {message}", buffer, 0)
+            buffer += data
+
+    def _csv_records(self):
+        reader = csv.DictReader(self._file)
+        for record in reader:
+            yield f"line {reader.line_num}", lambda record=record: record
+
+    def read_chunk(self, size):
+        """Returns up to size posts; an empty list once the file is exhausted."""
+        if self._unreadable is not None:
+            raise self._unreadable
+        posts = []
+        try:
+            for where, load in self._records:
+                try:
+                    posts.append(parse_post(load()))
+                except ValueError as e:
+                    self.skipped += 1
+                    if len(self.errors) < IMPORT_ERROR_SAMPLES:
+                        self.errors.append(f"{where}: {e}")
+                if len(posts) == size:
+                    break
+        except (UnicodeDecodeError, csv.Error, json.JSONDecodeError) as e:
+            # The posts read before the file went bad are still returned;
+            # the error is raised by the next call
+            if not posts:
+                raise
+            self._unreadable = e
+        return posts
+
+    def close(self):
+        self._file.close()
+
+async def import_posts(path, file_format, db_path, status):
+    """Streams the posts in the file at path into the database, a chunk per transaction.
+
+    Nothing is broadcast to subscribers; an import is a migration, not news.
+    Returns the summary shown to the admin.
+    """
+    reader = PostReader(path, file_format)
+    imported = failed = 0
+    stopped = None
+    try:
+        while True:
+            # Parsing runs off the event loop; only one chunk is held at a time
+            posts = await asyncio.to_thread(reader.read_chunk, IMPORT_CHUNK_SIZE)
+            if not posts:
+                break
+            saved = await async_database.import_posts(posts, db_path=db_path)
+            imported += saved
+            failed += len(posts) - saved
+            await status.update(f"Importing posts… {imported} imported so far.")
+    except UnicodeDecodeError:
+        stopped = "The rest of the file is not UTF-8 text and was not read."
+    except csv.Error as e:
+        stopped = f"The rest of the file could not be read: {e}"
+    except json.JSONDecodeError as e:
+        # Only a JSON array stops the import; a bad JSONL line is skipped
+        stopped = f"The rest of the file could not be read: {e.msg}"
+    finally:
+        reader.close()
+
+    lines = [f"Import finished: {imported} posts imported."]
+    if reader.skipped:
+        lines.append(f"{reader.skipped} records skipped:")
+        lines.extend(f"• {error}" for error in reader.errors)
+    if stopped:
+        lines.append(stopped)
+    if failed:
+        lines.append(f"{failed} posts could not be saved. Check logs.")
+    return "\n".join(lines)
+
+async def import_document(bot, document, db_path, status):
+    """Downloads an uploaded document to a temporary file and imports it."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import")
+        await status.update("Downloading file…", final=True)
+        telegram_file = await bot.get_file(document.file_id)
+        await telegram_file.download_to_drive(path)
+        await status.update("Importing posts…", final=True)
+        return await import_posts(path, file_format(document.file_name), db_path, status)
+
+# --- Export ---
+
+def _write_rows(writer, file_format, out, rows):
+    for row in rows:
+        if file_format == FORMAT_CSV:
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n")
+
+async def export_posts(path, file_format, db_path, status):
+    """Writes every post to the file at path, EXPORT_CHUNK_SIZE posts in memory at a time.
+
+    Returns the number of posts written.
+    """
+    exported = 0
+    after_id = 0
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = None
+        if file_format == FORMAT_CSV:
+            writer = csv.writer(out)
+            writer.writerow(EXPORT_COLUMNS)
+        while True:
+            rows = await async_database.list_posts_after(after_id, EXPORT_CHUNK_SIZE, db_path=db_path)
+            if not rows:
+                break
+            await asyncio.to_thread(_write_rows, writer, file_format, out, rows)
+            exported += len(rows)
+            after_id = rows[-1][0]
+            await status.update(f"Exporting posts… {exported} written so far.")
+    return exported
+
+async def send_export(bot, chat_id, file_format, db_path, status):
+    """Exports every post to a temporary file and sends it to chat_id as a document."""
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = f"posts.{file_format}"
+        path = os.path.join(tmp, file_name)
+        exported = await export_posts(path, file_format, db_path, status)
+        if not exported:
+            await status.update("There are no posts to export.", final=True)
+            return
+        await status.update(f"Sending {exported} posts…", final=True)
+        with open(path, "rb") as document:
+            await bot.send_document(chat_id, document, filename=file_name, caption=f"{exported} posts")
+        await status.update(f"Export finished: {exported} posts.", final=True)
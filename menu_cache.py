@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+# Rendered pages kept per generation, least recently used dropped first
+MAX_CACHED_PAGES = 64
+# Button rows remembered across rebuilds
+MAX_CACHED_ROWS = 4096
+
+class MenuCache:
+    """Keeps rendered reader menu pages until the posts generation changes.
+
+    Pages are keyed by their cursor (None for the first page). Button rows are
+    remembered per post, so when a page has to be rebuilt only posts that are
+    new or whose title changed get a fresh button.
+    """
+
+    def __init__(self, max_pages=MAX_CACHED_PAGES):
+        self.max_pages = max_pages
+        self.generation = None
+        self.post_count = None
+        self._pages = OrderedDict()
+        self._rows = {}
+
+    def get(self, generation, page_key=None):
+        """Returns the cached (text, reply_markup) or None if it is stale."""
+        if self.generation != generation:
+            return None
+        content = self._pages.get(page_key)
+        if content is not None:
+            self._pages.move_to_end(page_key)
+        return content
+
+    def _advance(self, generation):
+        if self.generation != generation:
+            self.generation = generation
+            self.post_count = None
+            self._pages.clear()
+
+    def store(self, generation, content, page_key=None):
+        # A render that raced with a newer write must not replace fresher pages
+        if self.generation is not None and generation < self.generation:
+            return
+        self._advance(generation)
+        self._pages[page_key] = content
+        self._pages.move_to_end(page_key)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def get_post_count(self, generation):
+        if self.generation != generation:
+            return None
+        return self.post_count
+
+    def store_post_count(self, generation, post_count):
+        if self.generation is not None and generation < self.generation:
+            return
+        self._advance(generation)
+        self.post_count = post_count
+
+    def button_rows(self, posts, make_row):
+        """Returns one keyboard row per post, reusing rows whose title is unchanged.
+
+        posts yields rows starting with (post_id, title); make_row builds a new
+        row for a (post_id, title) pair.
+        """
+        if len(self._rows) > MAX_CACHED_ROWS:
+            self._rows.clear()
+        keyboard = []
+        for post in posts:
+            post_id, title = post[0], post[1]
+            cached = self._rows.get(post_id)
+            if cached is None or cached[0] != title:
+                cached = (title, make_row(post_id, title))
+                self._rows[post_id] = cached
+            keyboard.append(cached[1])
+        return keyboard
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import async_database
+import database
+
+logger = logging.getLogger(__name__)
+
+# Seconds between persistence flushes; a crash loses at most this much
+PERSISTENCE_FLUSH_INTERVAL = 5
+
+class SQLitePersistence(BasePersistence):
+    """Keeps conversation state and user_data in the bot's own database.
+
+    The Application hands over everything that changed once per update
+    interval. Those changes are buffered and written together in a single
+    transaction, so the cost is one commit per interval however busy the bot
+    is. Only user_data and conversations are stored: bot_data holds live
+    objects (caches, the broadcaster) and chat_data is not used.
+    """
+
+    def __init__(self, db_path=database.DEFAULT_DB_NAME, update_interval=PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db_path = db_path
+        self._user_data = {}
+        self._conversations = {}
+        self._write_task = None
+
+    async def get_user_data(self):
+        rows = await async_database.load_persisted_user_data(db_path=self.db_path)
+        return {user_id: pickle.loads(data) for user_id, data in rows}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await async_database.load_persisted_conversations(name, db_path=self.db_path)
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name, key, new_state):
+        state = None if new_state is None else pickle.dumps(new_state)
+        self._conversations[(name, json.dumps(key))] = state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id, data):
+        self._user_data[user_id] = pickle.dumps(data)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id):
+        self._user_data[user_id] = None
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def _schedule_write(self):
+        # The Application issues a round of updates together; the task runs
+        # after all of them have been buffered
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        user_data, self._user_data = self._user_data, {}
+        conversations, self._conversations = self._conversations, {}
+        if not user_data and not conversations:
+            return
+        try:
+            await async_database.save_persisted_changes(user_data, conversations, db_path=self.db_path)
+        except Exception as e:
+            logger.error(f"Error saving persistence: {e}")
+            # Keep the batch for the next attempt unless newer changes replaced it
+            for user_id, data in user_data.items():
+                self._user_data.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self._conversations.setdefault(key, state)
+
+    async def flush(self):
+        if self._write_task is not None:
+            await self._write_task
+        await self._write()
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+import database
+
+# Rendered posts kept per database, least recently viewed dropped first
+MAX_CACHED_POSTS = 256
+
+class PostCache:
+    """LRU of rendered posts (text, reply_markup) for one database.
+
+    Entries are keyed by post id and the post's revision, a counter bumped by
+    every update or delete of that post, so a write invalidates the entry at
+    once and a render that raced with the write is never stored. Concurrent
+    misses for the same revision of a post share one load, so a click storm on
+    a new post costs a single database read.
+
+    The revision is this cache's own, bumped by the post listener, rather than
+    posts.revision: it also moves on delete, and checking it needs no read.
+    """
+
+    def __init__(self, max_posts=MAX_CACHED_POSTS):
+        self.max_posts = max_posts
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()   # post_id -> (revision, content)
+        self._revisions = {}
+        self._pending = {}    # (post_id, revision) -> load in flight
+        self._lock = threading.Lock()
+
+    def revision(self, post_id):
+        return self._revisions.get(post_id, 0)
+
+    def _get(self, post_id):
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is None or entry[0] != self.revision(post_id):
+                return None
+            self._entries.move_to_end(post_id)
+            return entry[1]
+
+    def store(self, post_id, revision, content):
+        with self._lock:
+            if revision != self.revision(post_id):
+                return
+            self._entries[post_id] = (revision, content)
+            self._entries.move_to_end(post_id)
+            while len(self._entries) > self.max_posts:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, post_id):
+        with self._lock:
+            self._revisions[post_id] = self.revision(post_id) + 1
+            self._entries.pop(post_id, None)
+
+    async def get_or_load(self, post_id, load):
+        """Returns the content for post_id, calling the coroutine function load() on a miss.
+
+        load returns the content to cache, or None if the post does not exist.
+        """
+        content = self._get(post_id)
+        if content is not None:
+            self.hits += 1
+            return content
+
+        # A load started before the post last changed may return the old
+        # content, so only loads of the current revision are joined
+        revision = self.revision(post_id)
+        key = (post_id, revision)
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        pending = asyncio.ensure_future(load())
+        self._pending[key] = pending
+        try:
+            content = await asyncio.shield(pending)
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+        if content is not None:
+            self.store(post_id, revision, content)
+        return content
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "cached": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+def format_stats(stats):
+    """Renders a post cache's stats as a line of plain text."""
+    return (
+        f"Post cache: {stats['cached']} cached, {stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['coalesced']} coalesced ({stats['hit_rate']:.0%} served without a read)"
+    )
+
+_caches = {}
+
+def get_post_cache(db_path=database.DEFAULT_DB_NAME):
+    key = database._db_key(db_path)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches.setdefault(key, PostCache())
+    return cache
+
+def _on_post_changed(db_key, post_id, post):
+    cache = _caches.get(db_key)
+    if cache is not None:
+        cache.invalidate(post_id)
+
+database.add_post_listener(_on_post_changed)
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Bot API limits (per bot token)
+GLOBAL_RATE = 30            # requests per second across all chats
+GLOBAL_BURST = 30
+PRIVATE_CHAT_RATE = 1.0     # messages per second in one private chat
+GROUP_CHAT_RATE = 20 / 60   # messages per second in one group
+CHAT_BURST = 3
+MAX_RETRIES = 3
+
+# Priority lanes, served in this order
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+LANE_NAMES = ("interactive", "normal", "bulk")
+
+# Direct answers to a user's click or inline query jump the queue
+INTERACTIVE_ENDPOINTS = frozenset({
+    "answerCallbackQuery",
+    "answerInlineQuery",
+    "editMessageText",
+    "editMessageReplyMarkup",
+    "editMessageCaption",
+})
+
+# How far down each lane the dispatcher looks for a request whose chat is not throttled
+LANE_SCAN_DEPTH = 32
+# Idle per-chat buckets are dropped after this many seconds
+CHAT_BUCKET_TTL = 60.0
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+class _PendingRequest:
+    __slots__ = ("chat_id", "enqueued_at", "ready")
+
+    def __init__(self, chat_id, enqueued_at, ready):
+        self.chat_id = chat_id
+        self.enqueued_at = enqueued_at
+        self.ready = ready
+
+class LaneStats:
+    __slots__ = ("sent", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.sent = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait):
+        self.sent += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+_schedulers = weakref.WeakSet()
+
+class SendScheduler(BaseRateLimiter):
+    """Token-bucket rate limiter with per-chat and global limits and priority lanes.
+
+    Every outbound request waits in one of three lanes until both the global
+    bucket and its chat's bucket have a token. A single dispatcher task releases
+    requests, always preferring the interactive lane, then normal, then bulk, and
+    skipping over requests whose chat is currently throttled so one busy chat
+    does not hold up the rest. A RetryAfter from Telegram pauses the whole
+    scheduler for the requested time before the request is retried.
+
+    Callers can pick a lane explicitly with rate_limit_args={"priority": PRIORITY_BULK}.
+    """
+
+    def __init__(
+        self,
+        name="bot",
+        global_rate=GLOBAL_RATE,
+        global_burst=GLOBAL_BURST,
+        private_chat_rate=PRIVATE_CHAT_RATE,
+        group_chat_rate=GROUP_CHAT_RATE,
+        chat_burst=CHAT_BURST,
+        max_retries=MAX_RETRIES,
+    ):
+        self.name = name
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._chats = {}
+        self._lanes = tuple(deque() for _ in LANE_NAMES)
+        self._stats = tuple(LaneStats() for _ in LANE_NAMES)
+        self._paused_until = 0.0
+        self._retry_after_count = 0
+        self._last_prune = time.monotonic()
+        self._wakeup = None
+        self._task = None
+        _schedulers.add(self)
+
+    async def initialize(self):
+        self._ensure_dispatcher()
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let anything still queued go out unthrottled rather than hang
+        for lane in self._lanes:
+            while lane:
+                pending = lane.popleft()
+                if not pending.ready.done():
+                    pending.ready.set_result(None)
+
+    def _ensure_dispatcher(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    def _priority(self, endpoint, rate_limit_args):
+        if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+            return rate_limit_args["priority"]
+        if endpoint in INTERACTIVE_ENDPOINTS:
+            return PRIORITY_INTERACTIVE
+        return PRIORITY_NORMAL
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_chat_rate if is_group else self.private_chat_rate
+            bucket = TokenBucket(rate, self.chat_burst, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self, now):
+        if now - self._last_prune < CHAT_BUCKET_TTL:
+            return
+        self._last_prune = now
+        idle = [chat_id for chat_id, bucket in self._chats.items() if now - bucket.updated > CHAT_BUCKET_TTL]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def _next_ready(self, now):
+        """Returns (request, None) for the next request to release, or (None, seconds to wait)."""
+        if now < self._paused_until:
+            return None, self._paused_until - now
+        global_delay = self._global.delay(now)
+        if global_delay > 0:
+            return None, global_delay
+
+        shortest = None
+        for lane in self._lanes:
+            for index, pending in enumerate(lane):
+                if index >= LANE_SCAN_DEPTH:
+                    break
+                if pending.ready.done():
+                    # Caller went away while waiting
+                    del lane[index]
+                    return None, 0.0
+                if pending.chat_id is None:
+                    delay = 0.0
+                else:
+                    delay = self._chat_bucket(pending.chat_id, now).delay(now)
+                if delay == 0:
+                    del lane[index]
+                    self._global.consume(now)
+                    if pending.chat_id is not None:
+                        self._chats[pending.chat_id].consume(now)
+                    return pending, None
+                if shortest is None or delay < shortest:
+                    shortest = delay
+        return None, shortest
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            pending, delay = self._next_ready(now)
+            if pending is not None:
+                pending.ready.set_result(None)
+                continue
+            if delay == 0:
+                continue
+            self._prune_chat_buckets(now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        self._ensure_dispatcher()
+        priority = self._priority(endpoint, rate_limit_args)
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.monotonic()
+        pending = _PendingRequest(data.get("chat_id"), enqueued_at, loop.create_future())
+        self._lanes[priority].append(pending)
+        self._wakeup.set()
+        await pending.ready
+        self._stats[priority].record(time.monotonic() - enqueued_at)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    raise
+                self._retry_after_count += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+                logger.warning(
+                    f"[{self.name}] Flood limit hit on {endpoint}, pausing sends for {exc.retry_after}s"
+                )
+                await asyncio.sleep(exc.retry_after)
+
+    def metrics(self):
+        """Returns queue depth and wait-time figures for each lane."""
+        lanes = {}
+        for name, lane, stats in zip(LANE_NAMES, self._lanes, self._stats):
+            lanes[name] = {
+                "queued": len(lane),
+                "sent": stats.sent,
+                "avg_wait": stats.total_wait / stats.sent if stats.sent else 0.0,
+                "max_wait": stats.max_wait,
+            }
+        return {
+            "name": self.name,
+            "queue_depth": sum(len(lane) for lane in self._lanes),
+            "tracked_chats": len(self._chats),
+            "retry_after": self._retry_after_count,
+            "lanes": lanes,
+        }
+
+def all_metrics():
+    """Metrics of every live scheduler in this process."""
+    return [scheduler.metrics() for scheduler in _schedulers]
+
+def format_metrics(metrics):
+    """Renders one scheduler's metrics as a few lines of plain text."""
+    lines = [
+        f"Send queue ({metrics['name']}): {metrics['queue_depth']} queued, "
+        f"{metrics['tracked_chats']} chats, {metrics['retry_after']} flood waits"
+    ]
+    for name, lane in metrics["lanes"].items():
+        lines.append(
+            f"  {name}: {lane['queued']} queued, {lane['sent']} sent, "
+            f"avg wait {lane['avg_wait']:.3f}s, max {lane['max_wait']:.3f}s"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Worker side: seconds between heartbeat lines written to stdout
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_PREFIX = "HEARTBEAT"
+
+# Supervisor side limits
+HEARTBEAT_TIMEOUT = 20                  # no heartbeat for this long means the worker is hung
+MAX_RSS_BYTES = 512 * 1024 * 1024       # recycle a worker above this resident memory
+MAX_CPU_PERCENT = 90.0                  # recycle a worker pinned above this CPU usage...
+CPU_STRIKES = 6                         # ...for this many heartbeats in a row
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 60.0
+STABLE_UPTIME = 60.0                    # running this long resets the restart backoff
+SHUTDOWN_GRACE = 10.0                   # seconds between SIGTERM and kill
+CHECK_INTERVAL = 1.0
+
+# --- Worker side ---
+
+def current_rss():
+    """Resident memory of this process in bytes (0 if it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Only the peak is available here; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+async def send_heartbeats(status=None, interval=HEARTBEAT_INTERVAL):
+    """Writes a heartbeat line to stdout every interval seconds, forever.
+
+    Run this as a task inside a supervised worker. Because it is scheduled on
+    the worker's event loop, heartbeats also stop when the loop is blocked.
+    status is an optional callable returning a short text shown by the supervisor.
+    """
+    while True:
+        extra = status() if status else ""
+        sys.stdout.write(f"{HEARTBEAT_PREFIX} {current_rss()} {time.process_time():.3f} {extra}\n")
+        sys.stdout.flush()
+        await asyncio.sleep(interval)
+
+# --- Process lifecycle ---
+
+def stop_on_signals():
+    """Returns an asyncio.Event that is set on SIGINT/SIGTERM."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Not available on Windows; Ctrl-C still raises KeyboardInterrupt
+            pass
+    return stop_event
+
+# --- Supervisor side ---
+
+class SupervisedProcess:
+    def __init__(self, name, cmd):
+        self.name = name
+        self.cmd = cmd
+        self.process = None
+        self.started_at = 0.0
+        self.last_heartbeat = 0.0
+        self.rss = 0
+        self.cpu_time = None
+        self.cpu_percent = 0.0
+        self.cpu_strikes = 0
+        self.status = ""
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_MIN
+        self.restart_at = 0.0
+        self.reader = None
+
+class Supervisor:
+    """Runs worker processes and keeps them healthy.
+
+    Workers report over their stdout pipe with send_heartbeats(). A worker that
+    exits, stops sending heartbeats, or goes over its memory or CPU ceiling is
+    stopped and started again after an exponential backoff. stop() shuts every
+    worker down gracefully, killing those that ignore SIGTERM.
+    """
+
+    def __init__(
+        self,
+        heartbeat_timeout=HEARTBEAT_TIMEOUT,
+        max_rss=MAX_RSS_BYTES,
+        max_cpu_percent=MAX_CPU_PERCENT,
+    ):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_rss = max_rss
+        self.max_cpu_percent = max_cpu_percent
+        self.children = {}
+        self._task = None
+
+    def add(self, name, cmd):
+        self.children[name] = SupervisedProcess(name, cmd)
+
+    async def start(self):
+        for child in self.children.values():
+            await self._spawn(child)
+        self._task = asyncio.create_task(self._monitor())
+
+    async def _spawn(self, child):
+        # We use CREATE_NEW_CONSOLE on Windows to ensure it runs independently and visible
+        creation_flags = 0
+        if sys.platform == "win32":
+            creation_flags = subprocess.CREATE_NEW_CONSOLE
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *child.cmd,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=os.getcwd(),
+                creationflags=creation_flags,
+            )
+        except Exception as e:
+            logger.error(f"Failed to start {child.name}: {e}")
+            self._schedule_restart(child, time.monotonic())
+            return
+
+        now = time.monotonic()
+        child.process = process
+        child.started_at = now
+        child.last_heartbeat = now
+        child.cpu_time = None
+        child.cpu_percent = 0.0
+        child.cpu_strikes = 0
+        child.reader = asyncio.create_task(self._read_heartbeats(child, process))
+        logger.info(f"Started {child.name} with PID {process.pid}")
+
+    async def _read_heartbeats(self, child, process):
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            parts = line.decode(errors="replace").split(maxsplit=3)
+            if len(parts) < 3 or parts[0] != HEARTBEAT_PREFIX:
+                continue
+            now = time.monotonic()
+            rss, cpu_time = int(parts[1]), float(parts[2])
+            if child.cpu_time is not None and now > child.last_heartbeat:
+                child.cpu_percent = 100.0 * (cpu_time - child.cpu_time) / (now - child.last_heartbeat)
+                if child.cpu_percent > self.max_cpu_percent:
+                    child.cpu_strikes += 1
+                else:
+                    child.cpu_strikes = 0
+            child.rss = rss
+            child.cpu_time = cpu_time
+            child.last_heartbeat = now
+            child.status = parts[3].strip() if len(parts) > 3 else ""
+        # Pipe closed: the worker exited, collect its return code
+        await process.wait()
+
+    def _schedule_restart(self, child, now):
+        if child.process is not None and now - child.started_at >= STABLE_UPTIME:
+            child.backoff = RESTART_BACKOFF_MIN
+        child.process = None
+        child.restart_at = now + child.backoff
+        child.backoff = min(child.backoff * 2, RESTART_BACKOFF_MAX)
+        child.restarts += 1
+
+    def _unhealthy_reason(self, child, now):
+        if now - child.last_heartbeat > self.heartbeat_timeout:
+            return f"no heartbeat for {now - child.last_heartbeat:.0f}s"
+        if child.rss > self.max_rss:
+            return f"RSS {child.rss // (1024 * 1024)} MB over limit"
+        if child.cpu_strikes >= CPU_STRIKES:
+            return f"CPU {child.cpu_percent:.0f}% over limit"
+        return None
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            now = time.monotonic()
+            for child in list(self.children.values()):
+                if child.process is None:
+                    if now >= child.restart_at:
+                        await self._spawn(child)
+                    continue
+
+                if child.process.returncode is not None:
+                    logger.warning(
+                        f"{child.name} exited with code {child.process.returncode}, "
+                        f"restarting in {child.backoff:.0f}s"
+                    )
+                    self._schedule_restart(child, now)
+                    continue
+
+                reason = self._unhealthy_reason(child, now)
+                if reason:
+                    logger.warning(f"Recycling {child.name}: {reason}")
+                    await self._terminate(child)
+                    self._schedule_restart(child, now)
+
+    async def _terminate(self, child):
+        process = child.process
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=SHUTDOWN_GRACE)
+        except asyncio.TimeoutError:
+            logger.warning(f"{child.name} ignored SIGTERM, killing it")
+            process.kill()
+            await process.wait()
+        if child.reader is not None:
+            child.reader.cancel()
+
+    async def stop(self):
+        """Stops monitoring and shuts every worker down."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*(self._terminate(child) for child in self.children.values()))
+
+    def status(self):
+        """Returns one line per worker: pid, uptime, memory, CPU and restarts."""
+        now = time.monotonic()
+        lines = []
+        for child in self.children.values():
+            if child.process is None:
+                lines.append(f"{child.name}: down, restart in {max(0, child.restart_at - now):.0f}s, {child.restarts} restarts")
+                continue
+            lines.append(
+                f"{child.name}: PID {child.process.pid}, up {now - child.started_at:.0f}s, "
+                f"{child.rss // (1024 * 1024)} MB, CPU {child.cpu_percent:.0f}%, "
+                f"{child.restarts} restarts, {child.status}"
+            )
+        return lines
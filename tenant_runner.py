@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from telegram import Update
+
+import database
+import async_database
+from handlers import Tenant, build_application
+from supervisor import send_heartbeats, stop_on_signals
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for dead child bots and newly added ones
+TENANT_REFRESH_INTERVAL = 10
+# Seconds before a child bot that failed to start is tried again
+FAILED_TENANT_RETRY = 300
+# Child bots starting at the same time during startup
+STARTUP_CONCURRENCY = 8
+# Upper bound of the random delay before each start, so bursts are spread out
+STARTUP_JITTER = 0.5
+# Slowest tenants listed in the startup report
+STARTUP_REPORT_LIMIT = 10
+
+def child_db_path(token, shared_store=""):
+    """Where a new child bot keeps its data: a bot_<id>.db file of its own, or
+    its partition of the shared_store file."""
+    bot_id = token.split(':')[0]
+    if shared_store:
+        return database.tenant_location(shared_store, bot_id)
+    return f"bot_{bot_id}.db"
+
+class TenantReadiness:
+    __slots__ = ("db_path", "state", "queued_at", "started_at", "ready_at")
+
+    def __init__(self, db_path, queued_at):
+        self.db_path = db_path
+        self.state = "queued"
+        self.queued_at = queued_at
+        self.started_at = None
+        self.ready_at = None
+
+class TenantRunner:
+    """Hosts many child bot Applications inside one asyncio event loop.
+
+    Every tenant keeps its own token, admin and database file, but they share
+    the interpreter, the imported libraries, the database executors and the
+    event loop, so an extra tenant costs a few polling tasks rather than a
+    whole process.
+    """
+
+    def __init__(self, ingress=None):
+        # With a WebhookIngress, tenants receive updates through it instead of polling
+        self.ingress = ingress
+        self.applications = {}
+        self.readiness = {}
+        self._configs = {}
+        self._failed = {}
+        self._starting = set()
+        self._sync_task = None
+
+    async def add_tenant(self, token, admin_id, db_path):
+        """Starts polling for one child bot. Returns True if it is running."""
+        if token in self.applications:
+            return True
+        if token in self._starting or time.monotonic() < self._failed.get(token, 0):
+            return False
+
+        readiness = self.readiness.get(token)
+        if readiness is None or readiness.state != "queued":
+            readiness = TenantReadiness(db_path, time.monotonic())
+            self.readiness[token] = readiness
+        readiness.state = "starting"
+        readiness.started_at = time.monotonic()
+        self._starting.add(token)
+
+        application = None
+        try:
+            await async_database.init_db(admin_id, db_path=db_path)
+            application = build_application(Tenant(token, admin_id, db_path))
+            await application.initialize()
+            if self.ingress is not None:
+                await self.ingress.register(application)
+            else:
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            await application.start()
+            # Run the same hooks Application.run_polling would
+            if application.post_init:
+                await application.post_init(application)
+        except Exception as e:
+            logger.error(f"Failed to start child bot ...{token[-5:]}: {e}")
+            self._failed[token] = time.monotonic() + FAILED_TENANT_RETRY
+            readiness.state = "failed"
+            if application is not None:
+                await self._stop_application(application)
+            return False
+        finally:
+            self._starting.discard(token)
+
+        self._failed.pop(token, None)
+        self.applications[token] = application
+        self._configs[token] = (admin_id, db_path)
+        readiness.state = "ready"
+        readiness.ready_at = time.monotonic()
+        logger.info(f"Started child bot ...{token[-5:]} using db {db_path}")
+        return True
+
+    async def start_tenants(self, bots, concurrency=STARTUP_CONCURRENCY, jitter=STARTUP_JITTER):
+        """Starts many tenants with bounded concurrency and jittered staggering.
+
+        bots is a list of (token, admin_id, db_path). Returns how many started.
+        """
+        # Bots still backing off after a failed start keep their "failed" readiness
+        now = time.monotonic()
+        bots = [
+            bot for bot in bots
+            if bot[0] not in self.applications and bot[0] not in self._starting and now >= self._failed.get(bot[0], 0)
+        ]
+        if not bots:
+            return 0
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def start_one(token, admin_id, db_path):
+            async with semaphore:
+                await asyncio.sleep(random.uniform(0, jitter))
+                return await self.add_tenant(token, admin_id, db_path)
+
+        queued_at = time.monotonic()
+        for token, _, db_path in bots:
+            self.readiness[token] = TenantReadiness(db_path, queued_at)
+        results = await asyncio.gather(*(start_one(*bot) for bot in bots))
+        logger.info("\n".join(self.startup_report()))
+        return sum(results)
+
+    def startup_report(self):
+        """Summary of tenant readiness, with the slowest tenants to become ready."""
+        states = {}
+        for readiness in self.readiness.values():
+            states[readiness.state] = states.get(readiness.state, 0) + 1
+        ready = sorted(
+            ((token, readiness) for token, readiness in self.readiness.items() if readiness.state == "ready"),
+            key=lambda item: item[1].ready_at - item[1].queued_at,
+            reverse=True,
+        )
+        summary = ", ".join(f"{count} {state}" for state, count in sorted(states.items()))
+        lines = [f"Child bots: {summary or 'none'}"]
+        for token, readiness in ready[:STARTUP_REPORT_LIMIT]:
+            lines.append(
+                f"  ...{token[-5:]}: ready after {readiness.ready_at - readiness.queued_at:.2f}s "
+                f"(start took {readiness.ready_at - readiness.started_at:.2f}s)"
+            )
+        return lines
+
+    def sync_in_background(self, main_db=database.DEFAULT_DB_NAME, shard=0, shards=1, shared_store=""):
+        """Keeps this process's child bots running without holding up the caller.
+
+        Runs refresh() now and then every TENANT_REFRESH_INTERVAL until stop(),
+        the same loop a worker process runs.
+        """
+        self._sync_task = asyncio.create_task(self._keep_in_sync(main_db, shard, shards, shared_store))
+
+    async def _keep_in_sync(self, main_db, shard, shards, shared_store):
+        while True:
+            try:
+                await self.refresh(main_db, shard, shards, shared_store)
+            except Exception as e:
+                logger.error(f"Error refreshing child bots: {e}")
+            await asyncio.sleep(TENANT_REFRESH_INTERVAL)
+
+    async def refresh(self, main_db=database.DEFAULT_DB_NAME, shard=0, shards=1, shared_store=""):
+        """One round of upkeep: restarts bots that stopped polling, starts bots
+        that are new or due a retry, and with a shared_store moves bots that
+        still have a file of their own into it."""
+        await self.restart_stopped()
+        started = await self.sync_from_db(main_db, shard, shards)
+        if started:
+            logger.info(f"Shard {shard}/{shards}: started {started} child bots, {len(self.applications)} running")
+        if shared_store:
+            await self.move_to_shared_store(shared_store, main_db, shard, shards)
+
+    async def move_tenant(self, token, admin_id, old_db_path, new_db_path, main_db=database.DEFAULT_DB_NAME):
+        """Copies a child bot's data to new_db_path and restarts it from there.
+
+        This bot pauses for as long as its copy takes, and Telegram holds its
+        updates meanwhile. The copy runs on its own thread, so writes to other
+        files carry on, but it is one transaction: writes by bots already in
+        new_db_path's file wait for it (up to SQLite's busy timeout). Returns
+        True once main_db points at new_db_path.
+        """
+        running = token in self.applications
+        # Stopping flushes persistence and pauses broadcasts, so the copy sees everything
+        await self.remove_tenant(token)
+        try:
+            posts = await async_database.copy_tenant(old_db_path, new_db_path)
+            await async_database.set_child_bot_db_path(token, new_db_path, db_path=main_db)
+        except Exception as e:
+            logger.error(f"Failed to move child bot ...{token[-5:]} to {new_db_path}: {e}")
+            if running:
+                await self.add_tenant(token, admin_id, old_db_path)
+            return False
+
+        # The old file is left on disk as a backup, but no longer held open
+        database.close_db(old_db_path)
+        logger.info(f"Moved child bot ...{token[-5:]} ({posts} posts) from {old_db_path} to {new_db_path}")
+        if running:
+            await self.add_tenant(token, admin_id, new_db_path)
+        return True
+
+    async def move_to_shared_store(self, shared_store, main_db=database.DEFAULT_DB_NAME, shard=0, shards=1):
+        """Moves this shard's child bots that have a file of their own into shared_store,
+        one bot at a time. Returns how many were moved."""
+        moved = 0
+        for bot_id, token, admin_id, db_path, _ in await async_database.get_all_child_bots(db_path=main_db):
+            if bot_id % shards != shard or database.split_location(db_path)[1]:
+                continue
+            if await self.move_tenant(token, admin_id, db_path, child_db_path(token, shared_store), main_db):
+                moved += 1
+        return moved
+
+    async def remove_tenant(self, token):
+        application = self.applications.pop(token, None)
+        self._configs.pop(token, None)
+        if application is not None:
+            await self._stop_application(application)
+
+    async def _stop_application(self, application):
+        # Each step runs even if an earlier one fails: a dead polling loop makes
+        # updater.stop() re-raise its error (e.g. InvalidToken), and the
+        # broadcaster, view counter and HTTP clients must still be released
+        if self.ingress is not None:
+            self.ingress.unregister(application)
+        try:
+            if application.updater.running:
+                await application.updater.stop()
+        except Exception as e:
+            logger.error(f"Error stopping child bot updates: {e}")
+        try:
+            if application.running:
+                await application.stop()
+                if application.post_stop:
+                    await application.post_stop(application)
+        except Exception as e:
+            logger.error(f"Error stopping child bot: {e}")
+        try:
+            await application.shutdown()
+        except Exception as e:
+            logger.error(f"Error shutting down child bot: {e}")
+
+    def _is_receiving(self, application):
+        if self.ingress is not None:
+            return application.running
+        # PTB leaves updater.running True after its polling loop gives up
+        # (e.g. on InvalidToken), so look at the polling task itself
+        polling_task = getattr(application.updater, "_Updater__polling_task", None)
+        if polling_task is not None and polling_task.done():
+            return False
+        return application.updater.running
+
+    async def restart_stopped(self):
+        """Restarts tenants whose polling loop has died. Returns how many were restarted."""
+        stopped = [token for token, application in self.applications.items() if not self._is_receiving(application)]
+        for token in stopped:
+            logger.warning(f"Child bot ...{token[-5:]} stopped polling, restarting it")
+            admin_id, db_path = self._configs[token]
+            await self.remove_tenant(token)
+            await self.add_tenant(token, admin_id, db_path)
+        return len(stopped)
+
+    async def stop(self):
+        """Stops every tenant."""
+        if self._sync_task is not None and not self._sync_task.done():
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.gather(*(self.remove_tenant(token) for token in list(self.applications)))
+
+    async def sync_from_db(self, main_db=database.DEFAULT_DB_NAME, shard=0, shards=1):
+        """Starts child bots from main_db's child_bots table that belong to this shard."""
+        pending = []
+        for bot in await async_database.get_all_child_bots(db_path=main_db):
+            # bot: id, token, admin_id, db_path, created_at
+            bot_id, token, admin_id, db_path, _ = bot
+            if bot_id % shards == shard:
+                pending.append((token, admin_id, db_path))
+        return await self.start_tenants(pending)
+
+async def run_worker(main_db, shard, shards, heartbeat=False, shared_store=""):
+    """Runs one shard of the child bots until SIGINT/SIGTERM."""
+    runner = TenantRunner()
+    if heartbeat:
+        # Report liveness, memory and CPU to the supervising main bot
+        heartbeat_task = asyncio.create_task(
+            send_heartbeats(lambda: f"{len(runner.applications)} bots running")
+        )
+    stop_event = stop_on_signals()
+
+    try:
+        while not stop_event.is_set():
+            await runner.refresh(main_db, shard, shards, shared_store)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=TENANT_REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if heartbeat:
+            heartbeat_task.cancel()
+        await runner.stop()
+
+def main() -> None:
+    """Run a shard of child bots in this process."""
+    parser = argparse.ArgumentParser(description="Run child blog bots in one process")
+    parser.add_argument("--main_db", default=database.DEFAULT_DB_NAME, help="Path to the main bot's SQLite DB")
+    parser.add_argument("--shard", type=int, default=0, help="Index of this worker")
+    parser.add_argument("--shards", type=int, default=1, help="Total number of workers")
+    parser.add_argument("--heartbeat", action="store_true", help="Write heartbeats to stdout for a supervisor")
+    parser.add_argument("--shared_store", default="", help="Move child bots with a database file of their own into this shared one")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    )
+    try:
+        asyncio.run(run_worker(args.main_db, args.shard, args.shards, args.heartbeat, args.shared_store))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Drain pending database work and release pooled connections
+        async_database.shutdown()
+        database.close_all()
+
+if __name__ == "__main__":
+    main()
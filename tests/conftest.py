@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The bot's modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+
+ADMIN_ID = 1
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A freshly initialised single-bot database."""
+    path = str(tmp_path / "bot.db")
+    database.init_db(ADMIN_ID, db_path=path)
+    yield path
+    database.close_all()
+
+@pytest.fixture
+def shared_store(tmp_path):
+    """A database file for several bots; use database.tenant_location to address one."""
+    yield str(tmp_path / "store.db")
+    database.close_all()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+import database
+import import_export
+from import_export import FORMAT_CSV, FORMAT_JSONL, PostReader
+
+class FakeMessage:
+    def __init__(self):
+        self.text = ""
+
+    async def edit_text(self, text):
+        self.text = text
+
+def import_file(path, file_format, db_path):
+    return asyncio.run(import_export.import_posts(path, file_format, db_path, import_export.StatusMessage(FakeMessage())))
+
+def export_file(path, file_format, db_path):
+    return asyncio.run(import_export.export_posts(path, file_format, db_path, import_export.StatusMessage(FakeMessage())))
+
+def read_all(path, file_format):
+    reader = PostReader(str(path), file_format)
+    try:
+        return reader.read_chunk(1000), reader
+    finally:
+        reader.close()
+
+@pytest.mark.parametrize("file_format", [FORMAT_JSONL, FORMAT_CSV])
+def test_export_then_import_round_trip(file_format, db_path, tmp_path):
+    database.add_post("Plain", "description", "https://example.com", "<b>content</b>", db_path=db_path)
+    database.add_post("Tricky, \"quoted\"", "line one\nline two", "", "ünïcode, 😀", db_path=db_path)
+    path = str(tmp_path / f"posts.{file_format}")
+    assert export_file(path, file_format, db_path) == 2
+
+    copy = str(tmp_path / "copy.db")
+    database.init_db(1, db_path=copy)
+    summary = import_file(path, file_format, copy)
+    assert summary == "Import finished: 2 posts imported."
+    # Ids are assigned afresh; everything else comes across unchanged
+    assert [post[1:] for post in database.get_all_posts(db_path=copy)] == [post[1:] for post in database.get_all_posts(db_path=db_path)]
+
+def test_bad_records_are_skipped_and_counted(db_path, tmp_path):
+    path = tmp_path / "posts.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"title": "Good"}),
+        "not json",
+        json.dumps({"description": "no title"}),
+        "",
+        json.dumps(["not", "an", "object"]),
+        json.dumps({"title": "Bad date", "created_at": "yesterday"}),
+        json.dumps({"title": "Also good"}),
+    ]), encoding="utf-8")
+
+    summary = import_file(str(path), FORMAT_JSONL, db_path)
+    lines = summary.splitlines()
+    assert lines[0] == "Import finished: 2 posts imported."
+    assert lines[1] == "4 records skipped:"
+    assert [line.split(":")[0] for line in lines[2:]] == ["• line 2", "• line 3", "• line 5", "• line 6"]
+    assert database.count_posts(db_path=db_path) == 2
+
+def test_csv_without_a_title_is_skipped(tmp_path):
+    path = tmp_path / "posts.csv"
+    # A spreadsheet's byte order mark must not end up in the first column's name
+    path.write_text("﻿title,content\nFirst,body\n,orphan body\n", encoding="utf-8")
+    posts, reader = read_all(path, FORMAT_CSV)
+    assert [post[0] for post in posts] == ["First"]
+    assert reader.skipped == 1 and reader.errors == ["line 3: no title"]
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-03-01 12:30:00", "2024-03-01 12:30:00"),
+    ("2024-03-01T12:30:00", "2024-03-01 12:30:00"),
+    ("2024-03-01T14:30:00+02:00", "2024-03-01 12:30:00"),
+    ("2024-03-01", "2024-03-01 00:00:00"),
+    ("", None),
+    (None, None),
+])
+def test_created_at_is_normalised_to_utc(value, expected):
+    assert import_export.parse_post({"title": "Post", "created_at": value})[4] == expected
+
+def test_json_array_is_read_an_element_at_a_time(tmp_path, monkeypatch):
+    # Small reads make elements straddle the read boundaries
+    monkeypatch.setattr(import_export, "JSON_READ_SIZE", 7)
+    path = tmp_path / "posts.json"
+    records = [{"title": f"Post {i}", "content": "x" * i * 5} for i in range(10)] + [{"content": "no title"}, 12345]
+    path.write_text("  \n" + json.dumps(records, indent=1), encoding="utf-8")
+    assert import_export.file_format(path.name) == FORMAT_JSONL
+
+    posts, reader = read_all(path, FORMAT_JSONL)
+    assert [post[0] for post in posts] == [f"Post {i}" for i in range(10)]
+    assert posts[9][3] == "x" * 45
+    assert reader.skipped == 2
+    assert reader.errors == ["record 11: no title", "record 12: not an object"]
+
+@pytest.mark.parametrize("text", ["[]", "[ ]\n"])
+def test_empty_json_array(text, tmp_path):
+    path = tmp_path / "posts.json"
+    path.write_text(text, encoding="utf-8")
+    assert read_all(path, FORMAT_JSONL)[0] == []
+
+def test_broken_json_array_keeps_what_came_before(db_path, tmp_path):
+    path = tmp_path / "posts.json"
+    path.write_text('[{"title": "First"}, {"title": "Second"} {"title": "Lost"}]', encoding="utf-8")
+    summary = import_file(str(path), FORMAT_JSONL, db_path)
+    assert summary.splitlines() == [
+        "Import finished: 2 posts imported.",
+        "The rest of the file could not be read: record 2: expected ',' or ']' after it",
+    ]
+
+def test_truncated_json_array(db_path, tmp_path):
+    path = tmp_path / "posts.json"
+    path.write_text('[{"title": "First"}, {"title": "Sec', encoding="utf-8")
+    summary = import_file(str(path), FORMAT_JSONL, db_path)
+    assert summary.splitlines()[0] == "Import finished: 1 posts imported."
+    assert summary.splitlines()[1].startswith("The rest of the file could not be read: record 2: Unterminated string")
@@ -0,0 +1,59 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import database
+from conftest import ROOT
+
+# Databases checked in with the repository, at the original unversioned schema
+BASELINE_DATABASES = ("blog_bot.db", "test_bot.db", "bot_7767591231.db")
+
+def read_rows(path, query):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+@pytest.fixture(params=BASELINE_DATABASES)
+def baseline_copy(request, tmp_path):
+    """A copy of one checked-in database; the originals are never opened for writing."""
+    path = str(tmp_path / request.param)
+    shutil.copyfile(os.path.join(ROOT, request.param), path)
+    yield path
+    database.close_all()
+
+def test_baseline_database_migrates_to_latest(baseline_copy):
+    posts = read_rows(baseline_copy, "SELECT id, title, description, link, content, created_at FROM posts ORDER BY id")
+    admins = read_rows(baseline_copy, "SELECT user_id FROM admins ORDER BY user_id")
+    child_bots = read_rows(baseline_copy, "SELECT token, admin_id, db_path FROM child_bots ORDER BY id")
+
+    assert database.migrate(baseline_copy) == len(database.MIGRATIONS)
+
+    assert database.get_all_posts(db_path=baseline_copy) == posts[::-1]
+    assert read_rows(baseline_copy, "SELECT user_id FROM admins WHERE bot_id = 0 ORDER BY user_id") == admins
+    assert [bot[1:4] for bot in database.get_all_child_bots(db_path=baseline_copy)] == child_bots
+    for user_id, in admins:
+        assert database.is_admin(user_id, db_path=baseline_copy)
+
+def test_migrated_baseline_database_is_usable(baseline_copy):
+    database.init_db(1, db_path=baseline_copy)
+    existing = [post[0] for post in database.get_all_posts(db_path=baseline_copy)]
+
+    post_id = database.add_post("Migrated", "description", "link", "content", db_path=baseline_copy)
+    assert post_id > max(existing, default=0)
+    assert [header.id for header in database.search_posts("migrated", db_path=baseline_copy).headers] == [post_id]
+    assert database.update_post_fields(post_id, {"title": "Renamed"}, 0, db_path=baseline_copy) == database.EDIT_SAVED
+    assert database.delete_post(post_id, db_path=baseline_copy)
+
+    # A deleted post's id is never handed out again
+    assert database.add_post("Next", "description", "link", "content", db_path=baseline_copy) == post_id + 1
+
+def test_migrating_twice_changes_nothing(baseline_copy):
+    database.migrate(baseline_copy)
+    schema = read_rows(baseline_copy, "SELECT sql FROM sqlite_master ORDER BY name")
+    database.close_all()
+    assert database.migrate(baseline_copy) == len(database.MIGRATIONS)
+    assert read_rows(baseline_copy, "SELECT sql FROM sqlite_master ORDER BY name") == schema
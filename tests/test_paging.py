@@ -0,0 +1,53 @@
+import database
+
+def add_posts(db_path, count, created_at=None):
+    post_ids = [database.add_post(f"Post {i}", "description", "link", "content", db_path=db_path) for i in range(count)]
+    if created_at is not None:
+        # Posts created within the same second share a timestamp
+        with database.get_connection(db_path) as conn, conn:
+            conn.execute("UPDATE posts SET created_at = ?", (created_at,))
+    return post_ids
+
+def walk_older(db_path, limit):
+    pages = []
+    page = database.list_post_headers_page(limit=limit, db_path=db_path)
+    pages.append(page)
+    while page.has_older:
+        last = page.headers[-1]
+        page = database.list_post_headers_page(older_than=(last.created_at, last.id), limit=limit, db_path=db_path)
+        pages.append(page)
+    return pages
+
+def test_pages_cover_every_post_once_latest_first(db_path):
+    post_ids = add_posts(db_path, 25, created_at="2024-01-01 00:00:00")
+    pages = walk_older(db_path, limit=10)
+
+    seen = [header.id for page in pages for header in page.headers]
+    assert seen == post_ids[::-1]
+    assert [len(page.headers) for page in pages] == [10, 10, 5]
+    assert not pages[0].has_newer and pages[1].has_newer
+
+def test_newer_cursor_returns_the_previous_page(db_path):
+    add_posts(db_path, 25)
+    first, second = walk_older(db_path, limit=10)[:2]
+    oldest_of_second = second.headers[0]
+    previous = database.list_post_headers_page(
+        newer_than=(oldest_of_second.created_at, oldest_of_second.id), limit=10, db_path=db_path
+    )
+    assert previous.headers == first.headers
+    assert not previous.has_newer and previous.has_older
+
+def test_exact_page_size_has_no_next_page(db_path):
+    add_posts(db_path, 10)
+    page = database.list_post_headers_page(limit=10, db_path=db_path)
+    assert len(page.headers) == 10 and not page.has_older
+
+def test_pages_only_hold_the_bots_own_posts(shared_store):
+    first = database.tenant_location(shared_store, 1)
+    second = database.tenant_location(shared_store, 2)
+    for location in (first, second):
+        database.init_db(1, db_path=location)
+    add_posts(first, 3)
+    add_posts(second, 2)
+    assert len(database.list_post_headers_page(db_path=first).headers) == 3
+    assert len(database.list_post_headers_page(db_path=second).headers) == 2
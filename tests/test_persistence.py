@@ -0,0 +1,67 @@
+import asyncio
+
+import database
+from persistence import SQLitePersistence
+
+def count_saves(monkeypatch):
+    calls = []
+    save = database.save_persisted_changes
+
+    def counting_save(*args, **kwargs):
+        calls.append(args)
+        return save(*args, **kwargs)
+
+    monkeypatch.setattr(database, "save_persisted_changes", counting_save)
+    return calls
+
+def test_one_round_of_changes_costs_one_commit(db_path, monkeypatch):
+    saves = count_saves(monkeypatch)
+    persistence = SQLitePersistence(db_path)
+
+    async def round_of_changes():
+        # What the Application hands over after a busy interval
+        for user_id in range(200):
+            await persistence.update_user_data(user_id, {"post_title": f"Draft {user_id}"})
+            await persistence.update_conversation("add_post", (user_id, user_id), 2)
+        await persistence.flush()
+
+    asyncio.run(round_of_changes())
+    assert len(saves) == 1
+
+    reloaded = SQLitePersistence(db_path)
+    user_data = asyncio.run(reloaded.get_user_data())
+    conversations = asyncio.run(reloaded.get_conversations("add_post"))
+    assert len(user_data) == 200
+    assert user_data[7] == {"post_title": "Draft 7"}
+    assert conversations[(7, 7)] == 2
+
+def test_ended_conversations_and_dropped_user_data_are_deleted(db_path):
+    persistence = SQLitePersistence(db_path)
+
+    async def changes():
+        await persistence.update_user_data(1, {"edit_post_id": 3})
+        await persistence.update_conversation("edit_post", (1, 1), 1)
+        await persistence.flush()
+        await persistence.drop_user_data(1)
+        await persistence.update_conversation("edit_post", (1, 1), None)
+        await persistence.flush()
+
+    asyncio.run(changes())
+    assert asyncio.run(persistence.get_user_data()) == {}
+    assert asyncio.run(persistence.get_conversations("edit_post")) == {}
+
+def test_bots_sharing_a_file_keep_separate_state(shared_store):
+    first = database.tenant_location(shared_store, 1001)
+    second = database.tenant_location(shared_store, 1002)
+    for location in (first, second):
+        database.init_db(1, db_path=location)
+
+    persistence = SQLitePersistence(first)
+
+    async def save():
+        await persistence.update_user_data(5, {"bot": "first"})
+        await persistence.flush()
+
+    asyncio.run(save())
+    assert asyncio.run(SQLitePersistence(first).get_user_data()) == {5: {"bot": "first"}}
+    assert asyncio.run(SQLitePersistence(second).get_user_data()) == {}
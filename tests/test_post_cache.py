@@ -0,0 +1,71 @@
+import asyncio
+
+import async_database
+import database
+import post_cache
+from post_cache import PostCache
+
+def test_concurrent_clicks_share_one_load():
+    cache = PostCache()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return "rendered", None
+
+    async def clicks():
+        return await asyncio.gather(*(cache.get_or_load(1, load) for _ in range(500)))
+
+    results = asyncio.run(clicks())
+    assert loads == 1
+    assert all(result == ("rendered", None) for result in results)
+    assert cache.stats()["coalesced"] == 499
+
+def test_click_after_edit_does_not_join_older_load():
+    cache = PostCache()
+    current = {"text": "before"}
+
+    async def load():
+        text = current["text"]
+        await asyncio.sleep(0.02)
+        return text
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_load(1, load))
+        await asyncio.sleep(0.005)
+        current["text"] = "after"
+        cache.invalidate(1)
+        second = await cache.get_or_load(1, load)
+        return await first, second, await cache.get_or_load(1, load)
+
+    first, second, cached = asyncio.run(scenario())
+    assert first == "before"
+    assert second == "after"
+    assert cached == "after"
+
+def test_load_racing_a_write_is_not_stored():
+    cache = PostCache()
+
+    async def load():
+        # The post changes while it is being rendered
+        cache.invalidate(1)
+        return "stale"
+
+    assert asyncio.run(cache.get_or_load(1, load)) == "stale"
+    assert cache.stats()["cached"] == 0
+
+def test_post_writes_invalidate_the_cache(db_path):
+    post_id = database.add_post("Title", "description", "link", "content", db_path=db_path)
+    cache = post_cache.get_post_cache(db_path)
+
+    async def render():
+        post = await async_database.get_post(post_id, db_path=db_path)
+        return post[1] if post else None
+
+    assert asyncio.run(cache.get_or_load(post_id, render)) == "Title"
+    database.update_post(post_id, "New title", "description", "link", "content", db_path=db_path)
+    assert asyncio.run(cache.get_or_load(post_id, render)) == "New title"
+    database.delete_post(post_id, db_path=db_path)
+    assert asyncio.run(cache.get_or_load(post_id, render)) is None
@@ -0,0 +1,82 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+import rate_limiter
+from rate_limiter import PRIORITY_BULK, SendScheduler, TokenBucket
+
+def test_token_bucket_allows_a_burst_then_refills():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    for _ in range(3):
+        assert bucket.delay(0.0) == 0
+        bucket.consume(0.0)
+    assert bucket.delay(0.0) == 0.5
+    assert bucket.delay(0.5) == 0
+    # Never refills beyond its capacity
+    assert bucket.delay(100.0) == 0
+    assert bucket.tokens == 3
+
+def send(scheduler, sent, label, chat_id=None, endpoint="sendMessage", rate_limit_args=None):
+    async def callback():
+        sent.append(label)
+        return label
+    data = {} if chat_id is None else {"chat_id": chat_id}
+    return scheduler.process_request(callback, (), {}, endpoint, data, rate_limit_args)
+
+def test_interactive_requests_jump_the_queue():
+    scheduler = SendScheduler("test", global_rate=20, global_burst=1)
+    sent = []
+
+    async def scenario():
+        await scheduler.initialize()
+        requests = [send(scheduler, sent, f"bulk {i}", rate_limit_args={"priority": PRIORITY_BULK}) for i in range(3)]
+        requests.append(send(scheduler, sent, "answer", endpoint="answerCallbackQuery"))
+        await asyncio.gather(*requests)
+        await scheduler.shutdown()
+
+    asyncio.run(scenario())
+    # Everything was queued before the first token was handed out
+    assert sent == ["answer", "bulk 0", "bulk 1", "bulk 2"]
+    assert scheduler.metrics()["lanes"]["interactive"]["sent"] == 1
+
+def test_throttled_chat_does_not_hold_up_others():
+    scheduler = SendScheduler("test", global_rate=1000, global_burst=100, private_chat_rate=5, chat_burst=1)
+    sent = []
+
+    async def scenario():
+        await scheduler.initialize()
+        await asyncio.gather(
+            send(scheduler, sent, "busy 1", chat_id=1),
+            send(scheduler, sent, "busy 2", chat_id=1),
+            send(scheduler, sent, "other", chat_id=2),
+        )
+        await scheduler.shutdown()
+
+    asyncio.run(scenario())
+    assert sent == ["busy 1", "other", "busy 2"]
+    assert scheduler.metrics()["lanes"]["normal"]["max_wait"] >= 0.15
+
+def test_retry_after_pauses_and_retries():
+    scheduler = SendScheduler("test")
+    attempts = []
+
+    async def callback():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise RetryAfter(0.01)
+        return "sent"
+
+    async def scenario():
+        await scheduler.initialize()
+        result = await scheduler.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+        await scheduler.shutdown()
+        return result
+
+    assert asyncio.run(scenario()) == "sent"
+    assert len(attempts) == 2
+    assert scheduler.metrics()["retry_after"] == 1
+
+def test_all_metrics_lists_live_schedulers():
+    scheduler = SendScheduler("listed")
+    assert any(metrics["name"] == "listed" for metrics in rate_limiter.all_metrics())
+    assert "listed" in rate_limiter.format_metrics(scheduler.metrics())
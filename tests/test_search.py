@@ -0,0 +1,60 @@
+import database
+
+def titles(page):
+    return [header.title for header in page.headers]
+
+def add_posts(db_path, *titles):
+    return [database.add_post(title, "description", "link", "content", db_path=db_path) for title in titles]
+
+def test_search_matches_title_description_and_content(db_path):
+    database.add_post("Python tips", "short", "link", "body", db_path=db_path)
+    database.add_post("Other", "all about pythons", "link", "body", db_path=db_path)
+    database.add_post("Third", "short", "link", "python inside", db_path=db_path)
+    database.add_post("Unrelated", "short", "link", "body", db_path=db_path)
+
+    # Title matches rank first
+    assert titles(database.search_posts("pyth", db_path=db_path))[0] == "Python tips"
+    assert sorted(titles(database.search_posts("pyth", db_path=db_path))) == ["Other", "Python tips", "Third"]
+
+def test_search_terms_do_not_match_bot_id(db_path):
+    add_posts(db_path, "First", "Second")
+    # Every post in a single-bot file has bot_id 0
+    assert titles(database.search_posts("0", db_path=db_path)) == []
+
+def test_search_terms_do_not_match_a_shared_bots_id(shared_store):
+    location = database.tenant_location(shared_store, 7767591231)
+    database.init_db(1, db_path=location)
+    add_posts(location, "First", "Second")
+    assert titles(database.search_posts("776", db_path=location)) == []
+    assert titles(database.search_posts("7767591231", db_path=location)) == []
+
+def test_bots_sharing_a_file_only_find_their_own_posts(shared_store):
+    main = database.tenant_location(shared_store, 0)
+    child = database.tenant_location(shared_store, 1234)
+    other = database.tenant_location(shared_store, 5678)
+    for location in (main, child, other):
+        database.init_db(1, db_path=location)
+    add_posts(main, "Hello from main")
+    add_posts(child, "Hello from child")
+    add_posts(other, "Hello from other")
+
+    assert titles(database.search_posts("hello", db_path=main)) == ["Hello from main"]
+    assert titles(database.search_posts("hello", db_path=child)) == ["Hello from child"]
+    assert titles(database.search_posts("hello", db_path=other)) == ["Hello from other"]
+
+def test_main_bot_file_shared_with_children_stays_isolated(db_path):
+    # CHILD_BOT_STORE pointed at the main bot's own file
+    child = database.tenant_location(db_path, 1234)
+    database.init_db(1, db_path=child)
+    add_posts(db_path, "Main news")
+    add_posts(child, "Child news")
+
+    assert titles(database.search_posts("news", db_path=db_path)) == ["Main news"]
+    assert titles(database.search_posts("news", db_path=child)) == ["Child news"]
+    assert database.count_posts(db_path=db_path) == 1
+
+def test_operators_typed_by_users_are_literal(db_path):
+    add_posts(db_path, "NOT this", "title: that")
+    assert titles(database.search_posts("NOT", db_path=db_path)) == ["NOT this"]
+    assert titles(database.search_posts('title: "that', db_path=db_path)) == ["title: that"]
+    assert database.make_search_query("!!! ---") is None
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from telegram.request import BaseRequest
+
+import async_database
+import database
+import http_pool
+from tenant_runner import TenantRunner
+
+TOKEN = "123456:TEST"
+
+class FakeBotAPI(BaseRequest):
+    """Answers Bot API calls without a network. getUpdates answers 401 while revoked is set."""
+
+    def __init__(self):
+        self.revoked = False
+        self.calls = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return 1.0
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls.append(endpoint)
+        if endpoint == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Test", "username": "test_bot"}
+        elif endpoint == "getUpdates":
+            await asyncio.sleep(0.01)
+            if self.revoked:
+                return 401, json.dumps({"ok": False, "error_code": 401, "description": "Unauthorized"}).encode()
+            result = []
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    api = FakeBotAPI()
+    monkeypatch.setattr(http_pool, "api_request", lambda: api)
+    monkeypatch.setattr(http_pool, "polling_request", lambda: api)
+    return api
+
+def polling_task(application):
+    return application.updater._Updater__polling_task
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+def test_tenant_with_revoked_token_still_shuts_down(bot_api, db_path):
+    async def scenario():
+        runner = TenantRunner()
+        assert await runner.add_tenant(TOKEN, 1, db_path)
+        application = runner.applications[TOKEN]
+        tenant = application.bot_data['tenant']
+
+        bot_api.revoked = True
+        # Polling gives up on InvalidToken, and updater.stop() re-raises it
+        await wait_for(lambda: polling_task(application).done())
+
+        await asyncio.wait_for(runner.stop(), timeout=5)
+        assert not application.running
+        # post_stop ran: the view counter's flush task is gone
+        assert tenant.view_counter._task is None
+
+    asyncio.run(scenario())
+
+def test_tenant_whose_polling_died_is_restarted(bot_api, db_path):
+    async def scenario():
+        runner = TenantRunner()
+        assert await runner.add_tenant(TOKEN, 1, db_path)
+        dead = runner.applications[TOKEN]
+        try:
+            assert await runner.restart_stopped() == 0
+
+            bot_api.revoked = True
+            await wait_for(lambda: polling_task(dead).done())
+            # PTB still reports the updater as running
+            assert dead.updater.running
+
+            bot_api.revoked = False
+            assert await runner.restart_stopped() == 1
+            restarted = runner.applications[TOKEN]
+            assert restarted is not dead and not dead.running
+            assert not polling_task(restarted).done()
+            calls = bot_api.calls.count("getUpdates")
+            await wait_for(lambda: bot_api.calls.count("getUpdates") > calls)
+            assert await runner.restart_stopped() == 0
+        finally:
+            await asyncio.wait_for(runner.stop(), timeout=5)
+
+    asyncio.run(scenario())
+
+def test_moving_a_bot_does_not_hold_up_other_writes(db_path, shared_store, tmp_path, monkeypatch):
+    main_db = str(tmp_path / "main.db")
+    database.init_db(1, db_path=main_db)
+    database.add_child_bot(TOKEN, 1, db_path, db_path=main_db)
+    database.add_post("Moved", "description", "link", "content", db_path=db_path)
+    new_location = database.tenant_location(shared_store, 123456)
+
+    copy_started = threading.Event()
+    release_copy = threading.Event()
+    copy_tenant = database.copy_tenant
+
+    def slow_copy(source_path, db_path):
+        copy_started.set()
+        release_copy.wait(timeout=5)
+        return copy_tenant(source_path, db_path)
+
+    monkeypatch.setattr(database, "copy_tenant", slow_copy)
+
+    async def scenario():
+        move = asyncio.create_task(TenantRunner().move_tenant(TOKEN, 1, db_path, new_location, main_db))
+        await wait_for(copy_started.is_set)
+        await asyncio.wait_for(async_database.add_post("Other", "description", "link", "content", db_path=main_db), timeout=2)
+        release_copy.set()
+        return await move
+
+    assert asyncio.run(scenario())
+    assert database.count_posts(db_path=new_location) == 1
+    assert database.get_all_child_bots(db_path=main_db)[0][3] == new_location
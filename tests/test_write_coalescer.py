@@ -0,0 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+from write_coalescer import WriteCoalescer
+
+@pytest.fixture
+def coalescer():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield WriteCoalescer(executor)
+    executor.shutdown()
+
+def add_post(coalescer, db_path, title):
+    return coalescer.submit(database.ADD_POST, db_path, title, "description", "link", "content")
+
+def test_concurrent_writes_share_one_commit(coalescer, db_path):
+    async def writers():
+        return await asyncio.gather(*(add_post(coalescer, db_path, f"Post {i}") for i in range(50)))
+
+    post_ids = asyncio.run(writers())
+    assert sorted(post_ids) == list(range(1, 51))
+    assert coalescer.stats()["commits"] == 1
+    assert coalescer.stats()["largest_batch"] == 50
+    assert database.count_posts(db_path=db_path) == 50
+
+def test_lone_write_is_committed_before_submit_returns(coalescer, db_path):
+    post_id = asyncio.run(add_post(coalescer, db_path, "Alone"))
+    assert database.get_post(post_id, db_path=db_path)[1] == "Alone"
+
+def test_failed_write_does_not_undo_the_rest_of_its_batch(coalescer, db_path):
+    async def writers():
+        return await asyncio.gather(
+            add_post(coalescer, db_path, "Kept"),
+            # posts.title is NOT NULL
+            add_post(coalescer, db_path, None),
+            coalescer.submit(database.ADD_ADMIN, db_path, 42),
+        )
+
+    kept, failed, admin_added = asyncio.run(writers())
+    assert coalescer.stats()["commits"] == 1
+    assert failed is False
+    assert database.get_post(kept, db_path=db_path)[1] == "Kept"
+    assert admin_added and database.is_admin(42, db_path=db_path)
+
+def test_edit_conflict_in_a_batch(coalescer, db_path):
+    post_id = database.add_post("Title", "description", "link", "content", db_path=db_path)
+
+    async def two_admins_edit():
+        return await asyncio.gather(
+            coalescer.submit(database.UPDATE_POST_FIELDS, db_path, post_id, {"title": "First"}, 0),
+            coalescer.submit(database.UPDATE_POST_FIELDS, db_path, post_id, {"title": "Second"}, 0),
+        )
+
+    assert asyncio.run(two_admins_edit()) == [database.EDIT_SAVED, database.EDIT_CONFLICT]
+    assert database.get_post(post_id, db_path=db_path)[1] == "First"
+
+def test_writes_to_different_files_commit_separately(coalescer, db_path, shared_store):
+    child = database.tenant_location(shared_store, 1234)
+    database.init_db(1, db_path=child)
+
+    async def writers():
+        await asyncio.gather(add_post(coalescer, db_path, "Main"), add_post(coalescer, child, "Child"))
+        await coalescer.drain()
+
+    asyncio.run(writers())
+    assert coalescer.stats()["commits"] == 2
+    assert database.count_posts(db_path=db_path) == 1
+    assert database.count_posts(db_path=child) == 1
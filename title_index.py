@@ -0,0 +1,177 @@
+import array
+import re
+import threading
+import time
+
+import database
+
+# Results returned for one query (Telegram accepts at most 50)
+INLINE_RESULTS_LIMIT = 20
+# Seconds one lookup may spend checking candidates before answering with what it has
+SEARCH_BUDGET = 0.02
+# Candidates checked between looks at the clock
+BUDGET_CHECK_EVERY = 256
+# Rebuild the postings once this many of them point at old titles
+MAX_STALE_POSTINGS = 50_000
+
+def _fold(text):
+    """Casefolded words of text, joined by single spaces."""
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+def _trigrams(folded):
+    grams = set()
+    for word in folded.split():
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return grams
+
+class TitleIndex:
+    """In-memory trigram index over the post titles of one database.
+
+    Each trigram maps to a compact array of the ids of posts whose title has
+    it. A lookup walks the postings of the query's rarest trigram, newest post
+    first, and checks each candidate title directly, so no set intersections are
+    needed. Queries shorter than three letters scan titles newest first instead.
+    Both stop when SEARCH_BUDGET runs out.
+
+    Post writes update the index through a database post listener. Changed or
+    deleted titles leave stale postings behind; lookups skip them, and the
+    postings are rebuilt from memory once too many pile up.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.posts = {}         # post_id -> (title, description, link)
+        self._folded = {}       # post_id -> folded title
+        self._postings = {}
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def load(self, db_path):
+        """Builds the index from db_path, retrying if a post is written meanwhile."""
+        while not self.loaded:
+            generation = database.get_post_generation(db_path)
+            rows = database.list_post_summaries(db_path)
+            with self._lock:
+                # A write that landed while loading was not seen by the listener
+                if generation != database.get_post_generation(db_path):
+                    continue
+                self.posts = {}
+                self._folded = {}
+                self._postings = {}
+                self._stale = 0
+                for post_id, title, description, link in rows:
+                    self._add(post_id, title, description, link)
+                self.loaded = True
+
+    def _add(self, post_id, title, description, link, old_grams=()):
+        folded = _fold(title)
+        self.posts[post_id] = (title, description, link)
+        self._folded[post_id] = folded
+        for gram in _trigrams(folded):
+            if gram not in old_grams:
+                self._post(gram, post_id)
+
+    def _post(self, gram, post_id):
+        posting = self._postings.get(gram)
+        if posting is None:
+            posting = self._postings[gram] = array.array("Q")
+        posting.append(post_id)
+
+    def apply(self, post_id, post):
+        """Applies one post write; post is (title, description, link, content) or None."""
+        with self._lock:
+            if not self.loaded:
+                return
+            old_folded = self._folded.get(post_id)
+            old_grams = _trigrams(old_folded) if old_folded is not None else set()
+            if post is None:
+                self.posts.pop(post_id, None)
+                self._folded.pop(post_id, None)
+                self._stale += len(old_grams)
+            else:
+                title, description, link, _ = post
+                self._add(post_id, title, description, link, old_grams)
+                self._stale += len(old_grams - _trigrams(self._folded[post_id]))
+            if self._stale > MAX_STALE_POSTINGS:
+                self._compact()
+
+    def _compact(self):
+        self._postings = {}
+        for post_id, folded in self._folded.items():
+            for gram in _trigrams(folded):
+                self._post(gram, post_id)
+        self._stale = 0
+
+    def search(self, query, limit=INLINE_RESULTS_LIMIT, budget=SEARCH_BUDGET):
+        """Returns up to limit (post_id, title, description, link) tuples whose
+        title contains every query word.
+
+        Titles starting with the query rank first, then titles with a word
+        starting with it, then any other match; newer posts first within each.
+        """
+        phrase = _fold(query)
+        terms = phrase.split()
+        deadline = time.monotonic() + budget
+        with self._lock:
+            if not terms:
+                return self._summaries(self._newest(limit))
+
+            grams = _trigrams(phrase)
+            if grams:
+                postings = [self._postings.get(gram) for gram in grams]
+                if any(posting is None for posting in postings):
+                    return []
+                candidates = reversed(min(postings, key=len))
+            else:
+                candidates = reversed(self._folded)
+
+            word_start = " " + terms[0]
+            ranked = ([], [], [])
+            seen = set()
+            for checked, post_id in enumerate(candidates, start=1):
+                if checked % BUDGET_CHECK_EVERY == 0 and time.monotonic() > deadline:
+                    break
+                folded = self._folded.get(post_id)
+                if folded is None or post_id in seen:
+                    continue
+                if not all(term in folded for term in terms):
+                    continue
+                seen.add(post_id)
+                if folded.startswith(phrase):
+                    ranked[0].append(post_id)
+                    if len(ranked[0]) >= limit:
+                        break
+                elif word_start in folded:
+                    ranked[1].append(post_id)
+                else:
+                    ranked[2].append(post_id)
+            return self._summaries((ranked[0] + ranked[1] + ranked[2])[:limit])
+
+    def _summaries(self, post_ids):
+        return [(post_id,) + self.posts[post_id] for post_id in post_ids]
+
+    def _newest(self, limit):
+        newest = []
+        for post_id in reversed(self._folded):
+            newest.append(post_id)
+            if len(newest) >= limit:
+                break
+        return newest
+
+_indexes = {}
+
+def get_title_index(db_path=database.DEFAULT_DB_NAME):
+    """Returns the title index for db_path. It is empty until load() has run."""
+    key = database._db_key(db_path)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes.setdefault(key, TitleIndex())
+    return index
+
+def _on_post_changed(db_key, post_id, post):
+    index = _indexes.get(db_key)
+    if index is not None:
+        index.apply(post_id, post)
+
+database.add_post_listener(_on_post_changed)
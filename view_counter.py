@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+import async_database
+import database
+
+logger = logging.getLogger(__name__)
+
+# Seconds between writes of buffered view counts to post_stats
+VIEW_FLUSH_INTERVAL = 30.0
+
+class ViewCounter:
+    """Post view counts for one bot, kept in memory and saved in batches.
+
+    record() only bumps a counter, so opening a post costs no database work.
+    Every VIEW_FLUSH_INTERVAL the counts gathered since the last flush are
+    added to post_stats as one batch of upserts. Flushes are aligned to the
+    clock, so the bots in a process flush in the same event loop turn and the
+    write coalescer commits all the bots sharing a file in one transaction.
+    Counts not yet flushed are lost only if the process crashes; stop()
+    flushes them on a clean shutdown.
+    """
+
+    def __init__(self, db_path=database.DEFAULT_DB_NAME, interval=VIEW_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self.recorded = 0
+        self.saved = 0
+        self.flushes = 0
+        self._counts = Counter()
+        self._task = None
+
+    def record(self, post_id):
+        self._counts[post_id] += 1
+        self.recorded += 1
+
+    async def flush(self):
+        """Adds the buffered counts to post_stats now."""
+        if not self._counts:
+            return
+        counts, self._counts = self._counts, Counter()
+        if await async_database.add_post_views(dict(counts), db_path=self.db_path):
+            self.saved += sum(counts.values())
+            self.flushes += 1
+        else:
+            # Kept for the next flush
+            self._counts.update(counts)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval - time.time() % self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error saving post views: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Stops the periodic flush and saves what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "recorded": self.recorded,
+            "saved": self.saved,
+            "pending": sum(self._counts.values()),
+            "flushes": self.flushes,
+        }
+
+def format_stats(stats):
+    """Renders the counter's stats as a line of plain text."""
+    return (
+        f"Post views: {stats['recorded']} recorded, {stats['saved']} saved in {stats['flushes']} flushes, "
+        f"{stats['pending']} waiting"
+    )
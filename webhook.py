@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+from telegram import Update
+
+from supervisor import stop_on_signals
+
+try:
+    from aiohttp import ClientSession, web
+except ImportError:
+    # Webhook mode is optional; polling works without aiohttp
+    ClientSession = web = None
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH_PREFIX = "/telegram/"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def bot_id_of(token):
+    return token.split(':')[0]
+
+def secret_for(token):
+    """Webhook secret for a bot, derived from its token so restarts keep it stable."""
+    return hmac.new(token.encode(), b"blog-bot-webhook", hashlib.sha256).hexdigest()
+
+class WebhookIngress:
+    """One HTTP server that receives webhook updates for every bot in the process.
+
+    Each bot registers under /telegram/<bot id>; a request is checked against
+    that bot's secret token and its update is queued on the bot's Application,
+    which processes it exactly as it would a polled update. Adding a bot adds a
+    route, not a connection.
+    """
+
+    def __init__(self, public_url, listen="0.0.0.0", port=8443):
+        if web is None:
+            raise RuntimeError("Webhook mode needs aiohttp: pip install aiohttp")
+        self.public_url = public_url.rstrip("/")
+        self.listen = listen
+        self.port = port
+        self._routes = {}
+        self._runner = None
+
+    def path_for(self, token):
+        return f"{WEBHOOK_PATH_PREFIX}{bot_id_of(token)}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH_PREFIX + "{bot_id}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Webhook ingress listening on {self.listen}:{self.port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def register(self, application, set_webhook=True):
+        """Routes updates for application's bot here and points Telegram at us."""
+        token = application.bot.token
+        self._routes[bot_id_of(token)] = (application, secret_for(token))
+        if set_webhook:
+            await application.bot.set_webhook(
+                url=self.public_url + self.path_for(token),
+                secret_token=secret_for(token),
+                allowed_updates=Update.ALL_TYPES,
+            )
+
+    def unregister(self, application):
+        self._routes.pop(bot_id_of(application.bot.token), None)
+
+    async def _handle(self, request):
+        route = self._routes.get(request.match_info["bot_id"])
+        if route is None:
+            return web.Response(status=404)
+        application, secret = route
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            logger.error(f"Bad webhook payload: {e}")
+            return web.Response(status=400)
+        # Answer Telegram at once; the Application works through its queue
+        await application.update_queue.put(update)
+        return web.Response()
+
+async def run_with_ingress(application, ingress):
+    """Runs application behind ingress until SIGINT/SIGTERM.
+
+    The webhook counterpart of Application.run_polling, including its
+    post_init, post_stop and post_shutdown hooks.
+    """
+    await ingress.start()
+    try:
+        async with application:
+            await ingress.register(application)
+            await application.start()
+            if application.post_init:
+                await application.post_init(application)
+            await stop_on_signals().wait()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+    finally:
+        await ingress.stop()
+
+# --- Local stand-in for Telegram, for testing the ingress ---
+
+def fake_message_update(text, user_id, update_id=None):
+    """A minimal private-chat message update, shaped like Telegram's JSON."""
+    now = int(time.time())
+    user = {"id": user_id, "is_bot": False, "first_name": "Test"}
+    return {
+        "update_id": update_id or now,
+        "message": {
+            "message_id": now,
+            "date": now,
+            "chat": {"id": user_id, "type": "private", "first_name": "Test"},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else [],
+        },
+    }
+
+async def send_fake_update(base_url, token, update):
+    """POSTs an update to a running ingress the way Telegram would. Returns the HTTP status."""
+    url = base_url.rstrip("/") + f"{WEBHOOK_PATH_PREFIX}{bot_id_of(token)}"
+    async with ClientSession() as session:
+        async with session.post(url, json=update, headers={SECRET_HEADER: secret_for(token)}) as response:
+            return response.status
+
+def main() -> None:
+    """Send a fake message update to a local webhook ingress."""
+    parser = argparse.ArgumentParser(description="Send a fake Telegram update to the webhook ingress")
+    parser.add_argument("--url", default="http://127.0.0.1:8443", help="Ingress base URL")
+    parser.add_argument("--token", required=True, help="Token of the bot to address")
+    parser.add_argument("--user", type=int, required=True, help="Sender's user ID")
+    parser.add_argument("--text", default="/start", help="Message text")
+    args = parser.parse_args()
+
+    update = fake_message_update(args.text, args.user)
+    status = asyncio.run(send_fake_update(args.url, args.token, update))
+    print(f"{status} {json.dumps(update)}")
+
+if __name__ == "__main__":
+    main()
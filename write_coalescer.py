@@ -0,0 +1,93 @@
+import asyncio
+
+import database
+
+# Seconds a batch stays open for more writes after the first one arrives. At 0
+# it takes whatever is queued in the same event loop turn, plus everything that
+# arrives while the previous batch commits, so a lone write is not delayed.
+WRITE_WINDOW = 0
+# Writes committed together at most
+MAX_BATCH_WRITES = 500
+# How hard each batch is pushed to disk (see database.DURABILITY_*)
+WRITE_DURABILITY = database.DURABILITY_NORMAL
+
+class WriteCoalescer:
+    """Groups writes to the same database file into one transaction.
+
+    The first write to a file opens a batch; every write to that file arriving
+    within the window, or while the previous batch is still committing, joins
+    it. The batch is applied on the write executor as a single transaction, so
+    a burst of N writes costs one commit instead of N.
+
+    submit() returns only once the caller's batch is committed, so a handler
+    that awaits a write and then reads sees its own change. durability sets
+    how far each commit is pushed to disk before callers are answered.
+    """
+
+    def __init__(self, executor, window=WRITE_WINDOW, max_batch=MAX_BATCH_WRITES, durability=WRITE_DURABILITY):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.durability = durability
+        self.writes = 0
+        self.commits = 0
+        self.largest_batch = 0
+        self._pending = {}    # database file -> [(op, db_path, args, future)]
+        self._flushers = {}
+
+    async def submit(self, op, db_path, *args):
+        """Queues op for db_path and returns its result once committed."""
+        db_file = database.split_location(db_path)[0]
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(db_file, []).append((op, db_path, args, future))
+        if db_file not in self._flushers:
+            self._flushers[db_file] = asyncio.create_task(self._flush(db_file))
+        # The write goes ahead even if the caller is cancelled meanwhile
+        return await asyncio.shield(future)
+
+    async def _flush(self, db_file):
+        try:
+            await asyncio.sleep(self.window)
+            while self._pending.get(db_file):
+                batch = self._pending[db_file][:self.max_batch]
+                del self._pending[db_file][:len(batch)]
+                await self._commit(batch)
+        finally:
+            del self._flushers[db_file]
+            self._pending.pop(db_file, None)
+
+    async def _commit(self, batch):
+        writes = [(op, db_path, args) for op, db_path, args, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, database.apply_writes, writes, self.durability)
+        except Exception as e:
+            # The transaction itself failed; every write in it is lost
+            results = [e] * len(batch)
+        else:
+            self.commits += 1
+        self.writes += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (op, _, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(database.write_result(op, result))
+
+    async def drain(self):
+        """Waits until every queued write is committed."""
+        while self._flushers:
+            await asyncio.gather(*self._flushers.values(), return_exceptions=True)
+
+    def stats(self):
+        return {
+            "writes": self.writes,
+            "commits": self.commits,
+            "largest_batch": self.largest_batch,
+            "writes_per_commit": self.writes / self.commits if self.commits else 0.0,
+        }
+
+def format_stats(stats):
+    """Renders the coalescer's stats as a line of plain text."""
+    return (
+        f"Write batching: {stats['writes']} writes in {stats['commits']} commits "
+        f"({stats['writes_per_commit']:.1f} per commit, largest {stats['largest_batch']})"
+    )